@@ -0,0 +1,290 @@
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from io import StringIO
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "benchmarks"))
+
+from fake_rcon import FakeRconServer  # noqa: E402
+from stub_http import StubHttpServer  # noqa: E402
+
+Online = Dict[str, str]
+Scenario = Callable[[int, Online], None]
+
+
+def fill(poll: int, online: Online, count: int):
+    for i in range(count):
+        online.setdefault(str(1000 + i), f"p{poll}x{i}")
+
+
+def steady(count: int) -> Scenario:
+    def step(poll: int, online: Online):
+        if poll == 0:
+            fill(poll, online, count)
+
+    return step
+
+
+def churn(count: int) -> Scenario:
+    def step(poll: int, online: Online):
+        if poll == 0:
+            fill(poll, online, count)
+            return
+        uid = str(1000 + (poll // 2) % count)
+        if online.pop(uid, None) is None:
+            online[uid] = f"p{poll}x{uid}"
+
+    return step
+
+
+def wave(count: int) -> Scenario:
+    def step(poll: int, online: Online):
+        if poll % 2:
+            online.clear()
+        else:
+            fill(poll, online, count)
+
+    return step
+
+
+SCENARIOS = {
+    "empty": (steady(0), 0.0),
+    "steady-8": (steady(8), 0.0),
+    "steady-32": (steady(32), 0.0),
+    "churn-32": (churn(32), 0.0),
+    "wave-32": (wave(32), 0.0),
+    "slow-rcon-8": (churn(8), 0.02),
+}
+
+
+def rows(online: Online):
+    return [
+        (name, uid, str(76561198000000000 + int(uid))) for uid, name in online.items()
+    ]
+
+
+class LegacyEngine:
+    def __init__(self, port: int, password: str, line_api: str, discord_url: str):
+        import pandas as pd
+        import requests
+        from rcon.source import Client
+
+        self.pd = pd
+        self.requests = requests
+        self.client = Client
+        self.port = port
+        self.password = password
+        self.line_api = line_api
+        self.discord_url = discord_url
+        self.prev_data = None
+        self.prev_data_raw = None
+
+    def run(self, *args):
+        with self.client("127.0.0.1", self.port, passwd=self.password) as client:
+            return client.run(*args, enforce_id=False)
+
+    def notify(self, text: str):
+        self.requests.post(
+            self.line_api,
+            headers={"Authorization": "Bearer token"},
+            data={"message": text},
+        )
+        self.requests.post(self.discord_url, json={"content": text})
+
+    def check(self):
+        pd = self.pd
+        next_data_raw = pd.read_csv(StringIO(self.run("ShowPlayers")))
+        next_data = next_data_raw[next_data_raw["playeruid"] != 0]
+        next_data = next_data.drop(columns=["steamid"])
+        if self.prev_data is None:
+            self.prev_data = next_data
+        if self.prev_data_raw is None:
+            self.prev_data_raw = next_data_raw
+        outer_data = pd.merge(next_data, self.prev_data, how="outer", indicator=True)
+        outer_raw_data = pd.merge(
+            next_data_raw, self.prev_data_raw, how="outer", indicator=True
+        )
+        join = outer_data[outer_data["_merge"] == "left_only"]
+        leave = outer_data[outer_data["_merge"] == "right_only"]
+        self.prev_data = next_data
+        self.prev_data_raw = next_data_raw
+        for rows_, template in ((join, "join {name}"), (leave, "leave {name}")):
+            for _, row in rows_.iterrows():
+                data = outer_raw_data[
+                    outer_raw_data["playeruid"] == row["playeruid"]
+                ].iloc[0]
+                text = template.format(**data)
+                self.run("Broadcast", text.replace(" ", "_"))
+                self.notify(text)
+
+    def close(self):
+        pass
+
+
+class SyncEngine:
+    def __init__(self, main):
+        self.client = main.PalworldNotify()
+
+    def check(self):
+        self.client.check()
+
+    def close(self):
+        self.client.close()
+
+
+class AsyncEngine:
+    def __init__(self, main):
+        self.loop = asyncio.new_event_loop()
+        self.client = main.AsyncPalworldNotify()
+
+    def check(self):
+        self.loop.run_until_complete(self.client.check())
+
+    def close(self):
+        self.loop.run_until_complete(self.client.close())
+        self.loop.close()
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(int(len(values) * q), len(values) - 1)]
+
+
+def notification_latency(stub: StubHttpServer, started: Dict[int, float]):
+    latencies = []
+    for arrived, path, body in stub.requests:
+        if not path.endswith("/discord"):
+            continue
+        for line in json.loads(body)["content"].splitlines():
+            if line.startswith("join p"):
+                poll = int(line[6:].split("x", 1)[0])
+                if poll in started:
+                    latencies.append(arrived - started[poll])
+                break
+    return latencies
+
+
+def measure(
+    name: str,
+    factory: Callable[[], object],
+    scenario: Scenario,
+    server: FakeRconServer,
+    stub: StubHttpServer,
+    polls: int,
+    trace: bool,
+) -> Dict[str, float]:
+    engine = factory()
+    online: Online = {}
+    stub.requests.clear()
+    wall: List[float] = []
+    cpu: List[float] = []
+    allocated: List[float] = []
+    started: Dict[int, float] = {}
+    try:
+        for poll in range(polls + 1):
+            scenario(poll, online)
+            server.set_players(rows(online))
+            if trace:
+                tracemalloc.start()
+            cpu_start = time.process_time()
+            started[poll] = wall_start = time.perf_counter()
+            engine.check()  # type: ignore
+            wall_end = time.perf_counter()
+            cpu_end = time.process_time()
+            if trace:
+                allocated.append(tracemalloc.get_traced_memory()[1] / 1024)
+                tracemalloc.stop()
+            if poll:
+                wall.append(wall_end - wall_start)
+                cpu.append(cpu_end - cpu_start)
+    finally:
+        engine.close()  # type: ignore
+    notify = notification_latency(stub, started)
+    return {
+        "p50": percentile(wall, 0.5) * 1e3,
+        "p95": percentile(wall, 0.95) * 1e3,
+        "cpu": statistics.fmean(cpu) * 1e3 if cpu else float("nan"),
+        "alloc": statistics.fmean(allocated) if allocated else float("nan"),
+        "notify": percentile(notify, 0.5) * 1e3,
+    }
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Benchmark PalworldNotify.check")
+    parser.add_argument("--polls", type=int, default=50)
+    parser.add_argument("--engines", default="legacy,sync,asyncio")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--http-delay", type=float, default=0.0)
+    parser.add_argument("--allocations", action="store_true")
+    args = parser.parse_args(argv)
+
+    server = FakeRconServer().start()
+    stub = StubHttpServer(delay=args.http_delay).start()
+    os.chdir(tempfile.mkdtemp(prefix="palworld_notify_bench_"))
+    os.environ.update(
+        ip="127.0.0.1",
+        port=str(server.port),
+        password=server.password,
+        line_notify_api=f"{stub.url}/line",
+        line_notify_token="token",
+        discord_webhook_url=f"{stub.url}/discord",
+        join_message="join {name}",
+        leave_message="leave {name}",
+        join_broadcast_message="join {name}",
+        leave_broadcast_message="leave {name}",
+        log_level="WARNING",
+    )
+    import main as palworld_notify
+
+    palworld_notify.startup()
+
+    engines = {
+        "legacy": lambda: LegacyEngine(
+            server.port, server.password, f"{stub.url}/line", f"{stub.url}/discord"
+        ),
+        "sync": lambda: SyncEngine(palworld_notify),
+        "asyncio": lambda: AsyncEngine(palworld_notify),
+    }
+
+    print(
+        f"{'engine':<8} {'scenario':<12} {'p50 ms':>8} {'p95 ms':>8} "
+        f"{'cpu ms':>8} {'alloc KiB':>10} {'notify ms':>10}"
+    )
+    try:
+        for engine in args.engines.split(","):
+            for scenario_name in args.scenarios.split(","):
+                scenario, delay = SCENARIOS[scenario_name]
+                server.delay = delay
+                result = measure(
+                    engine,
+                    engines[engine],
+                    scenario,
+                    server,
+                    stub,
+                    args.polls,
+                    args.allocations,
+                )
+                print(
+                    f"{engine:<8} {scenario_name:<12} {result['p50']:>8.2f} "
+                    f"{result['p95']:>8.2f} {result['cpu']:>8.2f} "
+                    f"{result['alloc']:>10.1f} {result['notify']:>10.2f}"
+                )
+    finally:
+        server.stop()
+        stub.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+import sys
+import timeit
+from io import StringIO
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from roster import Player, parse_players
+
+
+def make_payload(count: int) -> str:
+    lines = ["name,playeruid,steamid"]
+    for i in range(count):
+        lines.append(f"player_{i},{1000000000 + i},{76561198000000000 + i}")
+    return "\n".join(lines) + "\n"
+
+
+def pandas_path(text: str):
+    data = pd.read_csv(StringIO(text), dtype=str, keep_default_na=False)
+    data = data[data["playeruid"] != "0"]
+    return [Player(*row) for row in data.itertuples(index=False)]
+
+
+def parser_path(text: str):
+    return [player for player in parse_players(text) if not player.loading]
+
+
+def main(number: int = 2000):
+    print(f"{'players':>8} {'read_csv':>12} {'parse_players':>14} {'speedup':>8}")
+    for count in (0, 1, 8, 32):
+        text = make_payload(count)
+        assert pandas_path(text) == parser_path(text)
+        slow = min(timeit.repeat(lambda: pandas_path(text), number=number, repeat=3))
+        fast = min(timeit.repeat(lambda: parser_path(text), number=number, repeat=3))
+        print(
+            f"{count:>8} {slow / number * 1e6:>10.1f}us "
+            f"{fast / number * 1e6:>12.1f}us {slow / fast:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+import os
+import sys
+import tempfile
+import timeit
+from io import StringIO
+from pathlib import Path
+
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from bench_parse import make_payload  # noqa: E402
+
+TEMPLATE = "{name} ({steamid}) has joined the server."
+
+
+def legacy(prev_text: str, next_text: str):
+    next_data_raw = pd.read_csv(StringIO(next_text))
+    prev_data_raw = pd.read_csv(StringIO(prev_text))
+    next_data = next_data_raw[next_data_raw["playeruid"] != 0].drop(columns=["steamid"])
+    prev_data = prev_data_raw[prev_data_raw["playeruid"] != 0].drop(columns=["steamid"])
+    outer_data = pd.merge(next_data, prev_data, how="outer", indicator=True)
+    outer_raw_data = pd.merge(next_data_raw, prev_data_raw, how="outer", indicator=True)
+    texts = []
+    for _, row in outer_data[outer_data["_merge"] == "left_only"].iterrows():
+        data = outer_raw_data[outer_raw_data["playeruid"] == row["playeruid"]].iloc[0]
+        texts.append(TEMPLATE.format(**data))
+    return texts
+
+
+def current(client, prev_text: str, next_text: str):
+    from roster import RosterDiff
+
+    client.roster = RosterDiff()
+    client.update(prev_text)
+    return [text for text, _ in client.messages(client.update(next_text))]
+
+
+def main(number: int = 20):
+    os.chdir(tempfile.mkdtemp(prefix="palworld_notify_bench_"))
+    os.environ.update(join_message=TEMPLATE, log_level="WARNING")
+    import main as palworld_notify
+    from dispatcher import Dispatcher
+
+    palworld_notify.startup()
+    client = palworld_notify.BasePalworldNotify(dispatcher=Dispatcher([]))
+
+    empty = make_payload(0)
+    print(f"{'players':>8} {'legacy us/event':>16} {'current us/event':>17}")
+    for count in (1, 4, 8, 16, 32, 64):
+        full = make_payload(count)
+        assert legacy(empty, full) == current(client, empty, full)
+        slow = min(timeit.repeat(lambda: legacy(empty, full), number=number, repeat=3))
+        fast = min(
+            timeit.repeat(lambda: current(client, empty, full), number=number, repeat=3)
+        )
+        print(
+            f"{count:>8} {slow / number / count * 1e6:>16.1f} "
+            f"{fast / number / count * 1e6:>17.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+import argparse
+import re
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+ROOT = Path(__file__).resolve().parent.parent
+
+LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+FORBIDDEN = ("pandas", "numpy", "requests", "pydantic", "cProfile", "http.server")
+
+
+def importtime(code: str, cwd: Path) -> List[Tuple[int, int, str]]:
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=cwd,
+        env={"PYTHONPATH": str(ROOT)},
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        match = LINE.match(line)
+        if match:
+            rows.append((len(match.group(3)) // 2, int(match.group(2)), match.group(4)))
+    return rows
+
+
+def cumulative(rows: List[Tuple[int, int, str]]) -> Dict[str, int]:
+    return {name: total for _, total, name in rows}
+
+
+def children(rows: List[Tuple[int, int, str]], parent: str) -> List[Tuple[int, str]]:
+    pending: List[Tuple[int, str]] = []
+    for depth, total, name in rows:
+        if depth == 0:
+            if name == parent:
+                return pending
+            pending = []
+        elif depth == 1:
+            pending.append((total, name))
+    return []
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Measure main.py import cost")
+    parser.add_argument("--budget-ms", type=float, default=100)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    cwd = Path(tempfile.mkdtemp(prefix="palworld_notify_startup_"))
+    import_ms = []
+    startup_ms = []
+    for _ in range(args.repeat):
+        rows = importtime("import main", cwd)
+        import_ms.append(cumulative(rows)["main"] / 1000)
+        rows = importtime("import main; main.startup()", cwd)
+        totals = cumulative(rows)
+        startup_ms.append(
+            sum(totals.get(name, 0) for name in ("main", "settings")) / 1000
+        )
+
+    loaded = {name for _, _, name in importtime("import main", cwd)}
+    eager = sorted(
+        name for name in loaded if name.split(".")[0] in FORBIDDEN or name in FORBIDDEN
+    )
+    print(f"import main:            {min(import_ms):8.1f} ms (best of {args.repeat})")
+    print(f"import main + settings: {min(startup_ms):8.1f} ms (best of {args.repeat})")
+    print("slowest direct imports of main:")
+    rows = importtime("import main", cwd)
+    direct = children(rows, "main")
+    for total, name in sorted(direct, reverse=True)[:8]:
+        print(f"  {name:<30} {total / 1000:8.1f} ms")
+
+    failed = False
+    if eager:
+        print(f"FAIL: heavy modules imported eagerly: {', '.join(eager)}")
+        failed = True
+    if min(import_ms) > args.budget_ms:
+        print(f"FAIL: import main exceeds the {args.budget_ms:.0f} ms budget")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+import socket
+import socketserver
+import struct
+import threading
+import time
+from typing import List, Optional, Sequence, Set, Tuple
+
+SERVERDATA_AUTH = 3
+SERVERDATA_AUTH_RESPONSE = 2
+SERVERDATA_RESPONSE_VALUE = 0
+
+Row = Tuple[str, str, str]
+
+
+def render_players(rows: Sequence[Row]) -> str:
+    return "name,playeruid,steamid\n" + "".join(f"{n},{u},{s}\n" for n, u, s in rows)
+
+
+class FakeRconServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        password: str = "password",
+        delay: float = 0,
+    ):
+        super().__init__((host, port), _RconHandler)
+        self.password = password
+        self.delay = delay
+        self.players = render_players([])
+        self.commands: List[str] = []
+        self.connections = 0
+        self.clients: Set[socket.socket] = set()
+        self.thread: Optional[threading.Thread] = None
+
+    @property
+    def port(self) -> int:
+        return self.server_address[1]
+
+    def set_players(self, rows: Sequence[Row]):
+        self.players = render_players(rows)
+
+    def start(self) -> "FakeRconServer":
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        for client in list(self.clients):
+            try:
+                client.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            client.close()
+
+    def respond(self, command: str) -> str:
+        self.commands.append(command)
+        if self.delay:
+            time.sleep(self.delay)
+        if command == "ShowPlayers":
+            return self.players
+        if command.startswith("Broadcast "):
+            return f"Broadcasted: {command[10:]}\n"
+        if command == "Info":
+            return "Welcome to Pal Server[v0.1.4.1] FakeRcon\n"
+        return "Complete\n"
+
+
+class _RconHandler(socketserver.BaseRequestHandler):
+    server: FakeRconServer
+
+    def setup(self):
+        self.server.connections += 1
+        self.server.clients.add(self.request)
+
+    def finish(self):
+        self.server.clients.discard(self.request)
+
+    def handle(self):
+        file = self.request.makefile("rb")
+        while True:
+            header = file.read(4)
+            if len(header) < 4:
+                return
+            (size,) = struct.unpack("<i", header)
+            body = file.read(size)
+            request_id, request_type = struct.unpack("<ii", body[:8])
+            payload = body[8:-2].decode("utf-8")
+            if request_type == SERVERDATA_AUTH:
+                ok = payload == self.server.password
+                self.send(request_id if ok else -1, SERVERDATA_AUTH_RESPONSE, b"")
+            else:
+                response = self.server.respond(payload).encode("utf-8")
+                self.send(request_id, SERVERDATA_RESPONSE_VALUE, response)
+
+    def send(self, request_id: int, packet_type: int, payload: bytes):
+        body = struct.pack("<ii", request_id, packet_type) + payload + b"\x00\x00"
+        self.request.sendall(struct.pack("<i", len(body)) + body)
@@ -0,0 +1,256 @@
+import logging
+import queue
+import threading
+import time
+from enum import Enum
+from typing import TYPE_CHECKING, Callable, Iterator, List, Optional, Sequence, Tuple
+
+from metrics import FAILURES
+from profiling import PROFILER
+
+if TYPE_CHECKING:
+    from outbox import Outbox
+
+logger = logging.getLogger(__name__)
+
+Sink = Callable[[List[str]], None]
+Batch = Tuple[Optional[str], List[str]]
+
+_STOP = object()
+
+
+def chunk_messages(messages: List[str], limit: int, sep: str = "\n") -> Iterator[str]:
+    chunk = ""
+    for message in messages:
+        while len(message) > limit:
+            if chunk:
+                yield chunk
+                chunk = ""
+            yield message[:limit]
+            message = message[limit:]
+        if not chunk:
+            chunk = message
+        elif len(chunk) + len(sep) + len(message) <= limit:
+            chunk += sep + message
+        else:
+            yield chunk
+            chunk = message
+    if chunk:
+        yield chunk
+
+
+class OverflowPolicy(str, Enum):
+    DROP_OLDEST = "drop_oldest"
+    DROP_NEWEST = "drop_newest"
+    BLOCK = "block"
+
+
+class SinkWorker:
+    def __init__(
+        self,
+        sink: Sink,
+        maxsize: int,
+        overflow: OverflowPolicy,
+        block_timeout: Optional[float] = None,
+        outbox: Optional["Outbox"] = None,
+    ):
+        self.sink = sink
+        self.outbox = outbox
+        self.name = getattr(sink, "name", None) or getattr(
+            sink, "__name__", sink.__class__.__name__
+        )
+        self.overflow = overflow
+        self.block_timeout = block_timeout
+        self.concurrency = max(getattr(sink, "concurrency", 1), 1)
+        self.queue: "queue.Queue[object]" = queue.Queue(maxsize=maxsize)
+        self.dropped = 0
+        self.threads = [self._thread(i) for i in range(self.concurrency)]
+
+    def _thread(self, index: int) -> threading.Thread:
+        name = (
+            f"sink-{self.name}"
+            if self.concurrency == 1
+            else f"sink-{self.name}-{index}"
+        )
+        return threading.Thread(target=self._work, name=name, daemon=True)
+
+    def start(self):
+        for thread in self.threads:
+            thread.start()
+
+    def ensure_running(self):
+        for index, thread in enumerate(self.threads):
+            if thread.is_alive():
+                continue
+            logger.error(f"{self.name}: worker thread died, restarting")
+            FAILURES.labels(self.name).inc()
+            self.threads[index] = self._thread(index)
+            self.threads[index].start()
+
+    def submit(self, messages: List[str], key: Optional[str] = None) -> bool:
+        if key is None and self.outbox is not None:
+            key = self.outbox.add(self.name, messages)
+        batch: Batch = (key, messages)
+        try:
+            if self.overflow == OverflowPolicy.BLOCK:
+                self.queue.put(batch, timeout=self.block_timeout)
+            else:
+                self.queue.put_nowait(batch)
+            return True
+        except queue.Full:
+            pass
+        if self.overflow == OverflowPolicy.DROP_OLDEST:
+            try:
+                oldest = self.queue.get_nowait()
+                self.queue.task_done()
+                if oldest is not _STOP:
+                    self._drop("oldest", oldest)  # type: ignore
+            except queue.Empty:
+                pass
+            try:
+                self.queue.put_nowait(batch)
+                return True
+            except queue.Full:
+                pass
+        self._drop("newest", batch)
+        return False
+
+    def stop(self, deadline: Optional[float] = None):
+        for _ in self.threads:
+            try:
+                self.queue.put(_STOP, timeout=_remaining(deadline))
+            except queue.Full:
+                return
+
+    def join(self, deadline: Optional[float] = None):
+        for thread in self.threads:
+            thread.join(_remaining(deadline))
+        if any(thread.is_alive() for thread in self.threads):
+            logger.warning(
+                f"{self.name}: {self.queue.qsize()} notifications not flushed"
+            )
+
+    def _drop(self, which: str, batch: Batch):
+        self.dropped += 1
+        logger.warning(f"{self.name}: queue full, dropped {which} batch")
+        self._ack([batch[0]])
+
+    def _ack(self, keys: List[Optional[str]]):
+        if self.outbox is None:
+            return
+        for key in keys:
+            if key is not None:
+                self.outbox.ack(key, self.name)
+
+    def _work(self):
+        while True:
+            item = self.queue.get()
+            count = 1
+            batches: List[Batch] = []
+            stop = item is _STOP
+            while not stop:
+                batches.append(item)  # type: ignore
+                try:
+                    item = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                count += 1
+                stop = item is _STOP
+            messages = [message for _, batch in batches for message in batch]
+            try:
+                if messages:
+                    if PROFILER.active:
+                        PROFILER.call(self.sink, messages)
+                    else:
+                        self.sink(messages)
+                self._ack([key for key, _ in batches])
+            except Exception as e:
+                FAILURES.labels(self.name).inc()
+                logger.error(f"{self.name} failed: {e.__class__.__name__}: {e}")
+            finally:
+                for _ in range(count):
+                    self.queue.task_done()
+            if stop:
+                return
+
+
+class Dispatcher:
+    def __init__(
+        self,
+        sinks: Sequence[Sink],
+        maxsize: int = 256,
+        overflow: OverflowPolicy = OverflowPolicy.DROP_OLDEST,
+        block_timeout: Optional[float] = None,
+        flush_timeout: Optional[float] = None,
+        outbox: Optional["Outbox"] = None,
+    ):
+        self.flush_timeout = flush_timeout
+        self.outbox = outbox
+        self.workers: List[SinkWorker] = [
+            SinkWorker(sink, maxsize, overflow, block_timeout, outbox) for sink in sinks
+        ]
+        self.started = False
+        self.closed = False
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def start(self):
+        if not self.started:
+            self.started = True
+            for worker in self.workers:
+                worker.start()
+            if self.outbox is not None:
+                self.replay(self.outbox)
+
+    def replay(self, outbox: "Outbox"):
+        workers = {worker.name: worker for worker in self.workers}
+        for key, sink, messages in outbox.replay():
+            worker = workers.get(sink)
+            if worker is None:
+                logger.warning(f"outbox: sink {sink} is not configured, dropping")
+                outbox.ack(key, sink)
+                continue
+            logger.info(f"outbox: replaying {len(messages)} messages to {sink}")
+            worker.submit(messages, key)
+
+    def submit(self, messages: Sequence[str]):
+        if not messages:
+            return
+        if self.closed:
+            raise RuntimeError("Dispatcher is closed")
+        self.start()
+        batch = list(messages)
+        for worker in self.workers:
+            worker.ensure_running()
+            worker.submit(batch)
+
+    def depth(self) -> int:
+        return sum(worker.queue.qsize() for worker in self.workers)
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        if self.started:
+            deadline = None
+            if self.flush_timeout is not None:
+                deadline = time.monotonic() + self.flush_timeout
+            for worker in self.workers:
+                worker.stop(deadline)
+            for worker in self.workers:
+                worker.join(deadline)
+        for worker in self.workers:
+            close = getattr(worker.sink, "close", None)
+            if close is not None:
+                close()
+
+
+def _remaining(deadline: Optional[float]) -> Optional[float]:
+    if deadline is None:
+        return None
+    return max(deadline - time.monotonic(), 0)
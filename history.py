@@ -0,0 +1,141 @@
+import argparse
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from roster import RosterChanges
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY,
+    server TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    playeruid TEXT NOT NULL,
+    steamid TEXT NOT NULL,
+    name TEXT NOT NULL,
+    at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS sessions (
+    id INTEGER PRIMARY KEY,
+    server TEXT NOT NULL,
+    playeruid TEXT NOT NULL,
+    steamid TEXT NOT NULL,
+    name TEXT NOT NULL,
+    joined_at REAL NOT NULL,
+    left_at REAL,
+    duration REAL
+);
+CREATE INDEX IF NOT EXISTS events_playeruid ON events (playeruid, at);
+CREATE INDEX IF NOT EXISTS events_steamid ON events (steamid, at);
+CREATE INDEX IF NOT EXISTS sessions_playeruid ON sessions (playeruid, joined_at);
+CREATE INDEX IF NOT EXISTS sessions_steamid ON sessions (steamid, joined_at);
+CREATE INDEX IF NOT EXISTS sessions_open
+    ON sessions (server, playeruid) WHERE left_at IS NULL;
+"""
+
+CLOSE_SESSION = """
+UPDATE sessions SET left_at = :at, duration = :at - joined_at
+WHERE id = (
+    SELECT id FROM sessions
+    WHERE server = :server AND playeruid = :playeruid AND left_at IS NULL
+    ORDER BY joined_at DESC LIMIT 1
+)
+"""
+
+
+class SessionStore:
+    def __init__(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            path, check_same_thread=False, isolation_level=None
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def record(self, server: str, changes: RosterChanges, at: Optional[float] = None):
+        if not changes:
+            return
+        at = time.time() if at is None else at
+        events = [(server, "leave", *player, at) for player in changes.left] + [
+            (server, "join", *player, at) for player in changes.joined
+        ]
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(
+                    "INSERT INTO events (server, kind, name, playeruid, steamid, at)"
+                    " VALUES (?, ?, ?, ?, ?, ?)",
+                    events,
+                )
+                self._conn.executemany(
+                    CLOSE_SESSION,
+                    [
+                        {"server": server, "playeruid": player.playeruid, "at": at}
+                        for player in changes.left
+                    ],
+                )
+                self._conn.executemany(
+                    "INSERT INTO sessions (server, name, playeruid, steamid, joined_at)"
+                    " VALUES (?, ?, ?, ?, ?)",
+                    [(server, *player, at) for player in changes.joined],
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def playtime(
+        self, steamid: Optional[str] = None, playeruid: Optional[str] = None
+    ) -> float:
+        column, value = ("steamid", steamid) if steamid else ("playeruid", playeruid)
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT COALESCE(SUM(duration), 0) FROM sessions WHERE {column} = ?",
+                (value,),
+            ).fetchone()
+        return row[0]
+
+    def leaderboard(self, limit: int = 20) -> List[Tuple[str, str, float, int]]:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT steamid, MAX(name), SUM(duration), COUNT(*) FROM sessions"
+                " WHERE duration IS NOT NULL"
+                " GROUP BY steamid ORDER BY SUM(duration) DESC LIMIT ?",
+                (limit,),
+            ).fetchall()
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Query Palworld session history")
+    parser.add_argument("database", type=Path)
+    parser.add_argument("--steamid")
+    parser.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    with SessionStore(args.database) as store:
+        if args.steamid:
+            print(f"{store.playtime(steamid=args.steamid) / 3600:.2f} h")
+            return
+        for steamid, name, seconds, count in store.leaderboard(args.limit):
+            print(
+                f"{name:<24} {steamid:<24} {seconds / 3600:8.2f} h {count:6} sessions"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,30 @@
+import json
+import logging
+from datetime import datetime, timezone
+
+EVENT_FIELDS = {
+    "event": "event",
+    "server": "server",
+    "player": "name",
+    "uid": "uid",
+    "steamid": "steamid",
+    "command": "command",
+    "latency": "latency",
+}
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for attribute, field in EVENT_FIELDS.items():
+            value = getattr(record, attribute, None)
+            if value is not None:
+                data[field] = value
+        if record.exc_info:
+            data["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False)
@@ -1,61 +1,54 @@
+import asyncio
+import atexit
 import logging
 import os
+import queue
+import signal
+import threading
 import time
 import traceback
-from enum import Enum
-from io import StringIO
+from contextlib import ExitStack, contextmanager
 from logging import handlers
 from pathlib import Path
-from typing import Optional
-
-import pandas as pd
-import requests
-from pydantic import Field
-from pydantic_settings import BaseSettings, SettingsConfigDict
-from rcon.source import Client
-
-
-class LogLevel(str, Enum):
-    CRITICAL = "CRITICAL"
-    FATAL = "FATAL"
-    ERROR = "ERROR"
-    WARNING = "WARNING"
-    WARN = "WARN"
-    INFO = "INFO"
-    DEBUG = "DEBUG"
-    NOTSET = "NOTSET"
-
-
-class Settings(BaseSettings):
-    def __init__(self):
-        super().__init__()
-
-    model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf-8")
-    ip: str = Field(default="127.0.0.1")
-    port: int = Field(default=25575)
-    password: Optional[str] = Field(default=None)
-
-    line_notify_api: str = Field(default="https://notify-api.line.me/api/notify")
-    line_notify_token: Optional[str] = Field(default=None)
-
-    discord_webhook_url: Optional[str] = Field(default=None)
-
-    join_message: str = Field(default="{name} ({steamid}) has joined the server.")
-    leave_message: str = Field(default="{name} ({steamid}) has left the server.")
-
-    join_broadcast_message: str = Field(
-        default="{name} ({steamid}) has joined the server."
-    )
-    leave_broadcast_message: str = Field(
-        default="{name} ({steamid}) has left the server."
-    )
-    restart_on_last_leave: bool = Field(default=False)
-
-    wait_time: int = Field(default=5)
-    log_level: LogLevel = Field(default=LogLevel.INFO)
-
-
-def set_logger(level: LogLevel, path: Path) -> logging.Logger:
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List, Optional, Tuple
+
+from dispatcher import Dispatcher, Sink, chunk_messages
+from metrics import (
+    CHECK_SECONDS,
+    DIFF_SECONDS,
+    FAILURES,
+    JOINS,
+    LEAVES,
+    PARSE_SECONDS,
+    PLAYERS,
+    QUEUE_DEPTH,
+    RCON_SECONDS,
+    RENDER_SECONDS,
+    UNCHANGED,
+    WEBHOOK_SECONDS,
+    start_http_server,
+)
+from profiling import PROFILER, install_signal_handlers
+from rcon_session import AsyncRconSession, RconSession
+from roster import (
+    Player,
+    RosterChanges,
+    RosterDiff,
+    RosterSnapshot,
+    parse_players,
+)
+from scheduling import AdaptiveInterval, Backoff, CircuitBreaker, CircuitState
+from templates import Template
+
+if TYPE_CHECKING:
+    from history import SessionStore
+    from outbox import Outbox
+    from settings import LogFormat, LogLevel, ServerSettings, Settings
+
+
+def set_logger(
+    level: "LogLevel", path: Path, log_format: Optional["LogFormat"] = None
+) -> logging.Logger:
     os.makedirs(path.parent, exist_ok=True)
     file_handler = handlers.TimedRotatingFileHandler(
         filename=path,
@@ -68,116 +61,540 @@ def set_logger(level: LogLevel, path: Path) -> logging.Logger:
 
     stream_handler = logging.StreamHandler()
     stream_handler.setLevel(level.value)
-    logging.basicConfig(
-        level=level.value,
-        handlers=[file_handler, stream_handler],
+
+    if log_format == "json":
+        from jsonlog import JsonFormatter
+
+        formatter = JsonFormatter()
+    else:
+        formatter = logging.Formatter(logging.BASIC_FORMAT)
+    file_handler.setFormatter(formatter)
+    stream_handler.setFormatter(formatter)
+
+    log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    listener = handlers.QueueListener(
+        log_queue, file_handler, stream_handler, respect_handler_level=True
     )
+    listener.start()
+    atexit.register(listener.stop)
+    logging.basicConfig(level=level.value, handlers=[queue_handler(log_queue)])
     return logging.getLogger(__name__)
 
 
-env = Settings()
-logger = set_logger(env.log_level, Path("logs", "main.log"))
+def queue_handler(log_queue: Any) -> logging.Handler:
+    handler = handlers.QueueHandler(log_queue)
+    handler.setFormatter(logging.Formatter())
+    return handler
 
 
-def send_line_notify(notification_message: str):
-    assert env.line_notify_api
-    assert env.line_notify_token
-    headers = {"Authorization": f"Bearer {env.line_notify_token}"}
-    data = {"message": notification_message}
-    requests.post(env.line_notify_api, headers=headers, data=data)
+env: "Settings"
+logger = logging.getLogger(__name__)
 
 
-def send_discord_webhook(notification_message: str):
-    assert env.discord_webhook_url
-    json = {"content": notification_message}
-    requests.post(env.discord_webhook_url, json=json)
+def startup(settings: Optional["Settings"] = None, log_queue: Any = None) -> "Settings":
+    global env
+    if settings is None:
+        from settings import Settings
 
+        settings = Settings()
+    env = settings
+    if log_queue is None:
+        set_logger(env.log_level, Path("logs", "main.log"), env.log_format)
+    else:
+        logging.basicConfig(
+            level=env.log_level.value, handlers=[queue_handler(log_queue)]
+        )
+    return env
 
-class PalworldNotify:
-    prev_data: Optional[pd.DataFrame] = None
-    prev_data_raw: Optional[pd.DataFrame] = None
 
-    def run(self, *args):
-        with Client(env.ip, env.port, passwd=env.password) as client:
-            return client.run(*args, enforce_id=False)
+def http_options() -> Dict[str, Any]:
+    return dict(
+        connect_timeout=env.http_connect_timeout,
+        read_timeout=env.http_read_timeout,
+        pool_connections=env.http_pool_connections,
+        pool_maxsize=env.http_pool_maxsize,
+        max_retries=env.http_max_retries,
+        retry_backoff=env.http_retry_backoff,
+    )
 
-    def check(self):
-        players = self.run("ShowPlayers")
-        next_data_raw = pd.read_csv(StringIO(players))
-
-        next_data = next_data_raw[next_data_raw["playeruid"] != 0]
-        next_data = next_data.drop(columns=["steamid"])
-
-        if self.prev_data is None:
-            self.prev_data = next_data
-        if self.prev_data_raw is None:
-            self.prev_data_raw = next_data_raw
-
-        outer_data = pd.merge(
-            next_data,
-            self.prev_data,
-            how="outer",
-            indicator=True,
+
+def notification_sinks() -> List[Sink]:
+    configured = env.sink_settings()
+    if not configured:
+        return []
+    from sinks import create_sink
+
+    return [create_sink(settings, **http_options()) for settings in configured]
+
+
+def create_dispatcher(outbox: Optional["Outbox"] = None) -> Dispatcher:
+    dispatcher = Dispatcher(
+        notification_sinks(),
+        maxsize=env.dispatcher_queue_size,
+        overflow=env.dispatcher_overflow,
+        block_timeout=env.dispatcher_block_timeout,
+        flush_timeout=env.dispatcher_flush_timeout,
+        outbox=outbox,
+    )
+    QUEUE_DEPTH.set_function(dispatcher.depth)
+    return dispatcher
+
+
+class BasePalworldNotify:
+    def __init__(
+        self,
+        server: Optional["ServerSettings"] = None,
+        dispatcher: Optional[Dispatcher] = None,
+        history: Optional["SessionStore"] = None,
+    ):
+        self.server = server or env.server_settings()[0]
+        self.history = history
+        self.join_templates = (
+            Template(env.join_message),
+            Template(env.join_broadcast_message, escape_spaces=True),
         )
-        outer_raw_data = pd.merge(
-            next_data_raw,
-            self.prev_data_raw,
-            how="outer",
-            indicator=True,
+        self.leave_templates = (
+            Template(env.leave_message),
+            Template(env.leave_broadcast_message, escape_spaces=True),
         )
-
-        join = outer_data[outer_data["_merge"] == "left_only"]
-        leave = outer_data[outer_data["_merge"] == "right_only"]
-        restart = (
-            env.restart_on_last_leave and next_data.empty and not self.prev_data.empty
+        self.roster = RosterDiff()
+        self.last_players: Optional[str] = None
+        self.snapshot: Optional[RosterSnapshot] = None
+        if env.snapshot_dir:
+            self.snapshot = RosterSnapshot.for_server(
+                Path(env.snapshot_dir), self.server.label, env.snapshot_max_age
+            )
+            players = self.snapshot.load()
+            if players is not None:
+                self.roster.restore(players)
+                logger.info(
+                    f"[{self.server.label}] restored {len(players)} players from"
+                    f" {self.snapshot.path}"
+                )
+        self.interval = AdaptiveInterval(
+            min(env.poll_min_interval, env.wait_time),
+            env.poll_max_interval or env.wait_time * 6,
+            env.poll_backoff,
+        )
+        self.backoff = Backoff(
+            env.retry_backoff_base, env.retry_backoff_max, jitter=env.retry_jitter
+        )
+        self.breaker = CircuitBreaker(
+            env.circuit_failure_threshold, env.circuit_reset_timeout
+        )
+        self.owns_dispatcher = dispatcher is None
+        self.dispatcher = dispatcher or create_dispatcher()
+
+    def succeeded(self) -> float:
+        if self.breaker.state != CircuitState.CLOSED:
+            logger.info(f"[{self.server.label}] recovered")
+        self.breaker.record_success()
+        self.backoff.reset()
+        return self.interval.current
+
+    def failed(self, e: Exception) -> float:
+        FAILURES.labels("poll").inc()
+        self.breaker.record_failure()
+        delay = max(self.backoff.next(), self.breaker.remaining())
+        logger.warning(
+            f"[{self.server.label}] poll failed ({e.__class__.__name__}: {e}),"
+            f" circuit {self.breaker.state.value}, retrying in {delay:.1f}s"
+        )
+        return delay
+
+    @contextmanager
+    def measure_rcon(self, command: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            FAILURES.labels("rcon").inc()
+            raise
+        elapsed = time.perf_counter() - start
+        RCON_SECONDS.labels(self.server.label, command).observe(elapsed)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                f"[{self.server.label}] {command} took {elapsed * 1000:.1f}ms",
+                extra=dict(
+                    event="rcon",
+                    server=self.server.label,
+                    command=command,
+                    latency=elapsed,
+                ),
+            )
+
+    def update(self, players: str) -> RosterChanges:
+        label = self.server.label
+        if players == self.last_players and self.roster.roster is not None:
+            UNCHANGED.labels(label).inc()
+            self.interval.update(bool(self.roster.loading))
+            online = len(self.roster.roster)
+            return RosterChanges([], [], online, online)
+        with PARSE_SECONDS.labels(label).time():
+            parsed = parse_players(players)
+        self.last_players = players
+        with DIFF_SECONDS.labels(label).time():
+            changes = self.roster.update(parsed)
+        self.interval.update(bool(changes) or bool(self.roster.loading))
+        PLAYERS.labels(label).set(changes.online)
+        JOINS.labels(label).inc(len(changes.joined))
+        LEAVES.labels(label).inc(len(changes.left))
+        if changes and logger.isEnabledFor(logging.INFO):
+            for event, players in (("join", changes.joined), ("leave", changes.left)):
+                for player in players:
+                    logger.info(
+                        f"[{label}] {event}: {player}",
+                        extra=dict(
+                            event=event,
+                            server=label,
+                            player=player.name,
+                            uid=player.playeruid,
+                            steamid=player.steamid,
+                        ),
+                    )
+        return changes
+
+    def record(self, changes: RosterChanges):
+        label = self.server.label
+        if self.history is not None and changes:
+            try:
+                self.history.record(label, changes)
+            except Exception as e:
+                FAILURES.labels("history").inc()
+                logger.warning(
+                    f"[{label}] history not recorded ({e.__class__.__name__}: {e})"
+                )
+        if self.snapshot is None or self.roster.roster is None:
+            return
+        if changes or self.snapshot.stale:
+            try:
+                self.snapshot.save(self.roster.roster.values())
+            except OSError as e:
+                FAILURES.labels("snapshot").inc()
+                logger.warning(
+                    f"[{label}] roster snapshot not saved ({e.__class__.__name__}: {e})"
+                )
+
+    def messages(self, changes: RosterChanges) -> List[Tuple[str, str]]:
+        if not changes:
+            return []
+        with RENDER_SECONDS.labels(self.server.label).time():
+            return self._messages(changes)
+
+    def _messages(self, changes: RosterChanges) -> List[Tuple[str, str]]:
+        return [
+            self.render(*self.join_templates, player) for player in changes.joined
+        ] + [self.render(*self.leave_templates, player) for player in changes.left]
+
+    def render(
+        self, message: Template, broadcast_message: Template, player: Player
+    ) -> Tuple[str, str]:
+        label = self.server.label
+        return message.render(player, label), broadcast_message.render(player, label)
+
+    def broadcasts(self, messages: List[Tuple[str, str]]) -> List[Tuple[str, str]]:
+        texts = chunk_messages(
+            [text for _, text in messages],
+            env.broadcast_max_length,
+            env.broadcast_separator,
         )
+        return [("Broadcast", text) for text in texts]
+
+    def should_restart(self, changes: RosterChanges) -> bool:
+        return self.server.restart_on_last_leave and changes.emptied
+
+
+class PalworldNotify(BasePalworldNotify):
+    def __init__(
+        self,
+        server: Optional["ServerSettings"] = None,
+        dispatcher: Optional[Dispatcher] = None,
+        history: Optional["SessionStore"] = None,
+    ):
+        super().__init__(server, dispatcher, history)
+        self.session = RconSession(
+            self.server.ip,
+            self.server.port,
+            passwd=self.server.password,
+            timeout=env.rcon_timeout,
+            health_check_interval=env.rcon_health_check_interval,
+        )
+
+    def run(self, *args):
+        with self.measure_rcon(args[0]):
+            return self.session.run(*args)
+
+    def run_many(self, commands: List[Tuple[str, str]]) -> List[str]:
+        with self.measure_rcon(commands[0][0]):
+            return self.session.run_many(commands)
 
-        self.prev_data = next_data
-        self.prev_data_raw = next_data_raw
-
-        if not join.empty or not leave.empty:
-            logger.info("\n" + outer_data.to_string())
-
-        for _, row in join.iterrows():
-            data = outer_raw_data[outer_raw_data["playeruid"] == row["playeruid"]].iloc[
-                0
-            ]
-            text = env.join_message.format(**data)
-            text_broadcast = env.join_broadcast_message.format(**data)
-            text_broadcast = text_broadcast.replace(" ", "_")
-            self.run("Broadcast", text_broadcast)
-            if env.line_notify_token:
-                send_line_notify(text)
-            if env.discord_webhook_url:
-                send_discord_webhook(text)
-
-        for _, row in leave.iterrows():
-            data = outer_raw_data[outer_raw_data["playeruid"] == row["playeruid"]].iloc[
-                0
-            ]
-            text = env.leave_message.format(**data)
-            text_broadcast = env.leave_broadcast_message.format(**data)
-            text_broadcast = text_broadcast.replace(" ", "_")
-            self.run("Broadcast", text_broadcast)
-            if env.line_notify_token:
-                send_line_notify(text)
-            if env.discord_webhook_url:
-                send_discord_webhook(text)
-
-        if restart:
-            logger.info("Restarting the server...")
+    def close(self):
+        self.session.close()
+        if self.owns_dispatcher:
+            self.dispatcher.close()
+
+    def check(self):
+        with CHECK_SECONDS.labels(self.server.label).time():
+            changes = self.update(self.run("ShowPlayers"))
+            messages = self.messages(changes)
+            self.dispatcher.submit([text for text, _ in messages])
+            self.record(changes)
+            commands = self.broadcasts(messages)
+            if commands:
+                self.run_many(commands)
+
+        if self.should_restart(changes):
+            logger.info(f"[{self.server.label}] Restarting the server...")
             self.run("Save")
             time.sleep(5)
             self.run("Shutdown", "5")
 
+    def poll(self) -> float:
+        if not self.breaker.allow():
+            return self.breaker.remaining()
+        try:
+            self.check()
+        except Exception as e:
+            self.session.close()
+            return self.failed(e)
+        return self.succeeded()
+
+
+class AsyncPalworldNotify(BasePalworldNotify):
+    def __init__(
+        self,
+        server: Optional["ServerSettings"] = None,
+        dispatcher: Optional[Dispatcher] = None,
+        history: Optional["SessionStore"] = None,
+    ):
+        super().__init__(server, dispatcher, history)
+        self.session = AsyncRconSession(
+            self.server.ip,
+            self.server.port,
+            passwd=self.server.password,
+            timeout=env.rcon_timeout,
+            health_check_interval=env.rcon_health_check_interval,
+        )
+
+    async def run(self, *args):
+        with self.measure_rcon(args[0]):
+            return await self.session.run(*args)
+
+    async def run_many(self, commands: List[Tuple[str, str]]) -> List[str]:
+        with self.measure_rcon(commands[0][0]):
+            return await self.session.run_many(commands)
+
+    async def close(self):
+        await self.session.close()
+        if self.owns_dispatcher:
+            await asyncio.to_thread(self.dispatcher.close)
+
+    async def check(self):
+        with CHECK_SECONDS.labels(self.server.label).time():
+            changes = self.update(await self.run("ShowPlayers"))
+            messages = self.messages(changes)
+            if messages:
+                await asyncio.to_thread(
+                    self.dispatcher.submit, [text for text, _ in messages]
+                )
+            self.record(changes)
+            commands = self.broadcasts(messages)
+            if commands:
+                await self.run_many(commands)
+
+        if self.should_restart(changes):
+            logger.info(f"[{self.server.label}] Restarting the server...")
+            await self.run("Save")
+            await asyncio.sleep(5)
+            await self.run("Shutdown", "5")
+
+    async def poll(self) -> float:
+        if not self.breaker.allow():
+            return self.breaker.remaining()
+        try:
+            await self.check()
+        except Exception as e:
+            await self.session.close()
+            return self.failed(e)
+        return self.succeeded()
+
+    async def serve(self, phase: float = 0):
+        loop = asyncio.get_running_loop()
+        await asyncio.sleep(phase)
+        deadline = loop.time()
+        while True:
+            deadline = max(deadline + await self.poll(), loop.time())
+            await asyncio.sleep(deadline - loop.time())
+
+
+def open_outbox() -> Optional["Outbox"]:
+    if not env.outbox_path:
+        return None
+    from outbox import Outbox
+
+    return Outbox(
+        Path(env.outbox_path),
+        commit_interval=env.outbox_commit_interval,
+        compact_threshold=env.outbox_compact_threshold,
+    )
+
+
+def open_history() -> Optional["SessionStore"]:
+    if not env.history_db:
+        return None
+    from history import SessionStore
+
+    return SessionStore(Path(env.history_db))
+
+
+async def serve_async(dispatcher: Dispatcher, history: Optional["SessionStore"] = None):
+    servers = env.server_settings()
+    clients = [AsyncPalworldNotify(server, dispatcher, history) for server in servers]
+    try:
+        await asyncio.gather(
+            *(
+                client.serve(env.wait_time * i / len(clients))
+                for i, client in enumerate(clients)
+            )
+        )
+    finally:
+        await asyncio.gather(*(client.close() for client in clients))
+
+
+def serve_sync(dispatcher: Dispatcher, history: Optional["SessionStore"] = None):
+    servers = env.server_settings()
+    clients = [PalworldNotify(server, dispatcher, history) for server in servers]
+    due = [0.0] * len(clients)
+    try:
+        while True:
+            for i, client in enumerate(clients):
+                if due[i] <= time.monotonic():
+                    due[i] = time.monotonic() + client.poll()
+            time.sleep(max(min(due) - time.monotonic(), 0))
+    finally:
+        for client in clients:
+            client.close()
+
+
+async def serve_shard(
+    servers: Optional[List["ServerSettings"]],
+    control: Any,
+    dispatcher: Any,
+    history: Optional["SessionStore"] = None,
+):
+    from sharding import receive
+
+    running: Dict[
+        str, Tuple["ServerSettings", AsyncPalworldNotify, "asyncio.Task[None]"]
+    ] = {}
+
+    async def stop(label: str):
+        _, client, task = running.pop(label)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        await client.close()
+        PLAYERS.remove(label)
+
+    try:
+        while servers is not None:
+            wanted = {server.label: server for server in servers}
+            for label, (server, _, _) in list(running.items()):
+                if wanted.get(label) != server:
+                    await stop(label)
+            added = [server for label, server in wanted.items() if label not in running]
+            for i, server in enumerate(added):
+                client = AsyncPalworldNotify(server, dispatcher, history)
+                task = asyncio.create_task(client.serve(env.wait_time * i / len(added)))
+                running[server.label] = (server, client, task)
+            servers = await asyncio.to_thread(receive, control)
+    finally:
+        for label in list(running):
+            await stop(label)
+
+
+def shard_worker(
+    settings: "Settings",
+    index: int,
+    servers: List["ServerSettings"],
+    control: Any,
+    events: Any,
+    logs: Any,
+):
+    from sharding import ShardDispatcher
+
+    for name in ("SIGINT", "SIGHUP", "SIGUSR1", "SIGUSR2"):
+        if hasattr(signal, name):
+            signal.signal(getattr(signal, name), signal.SIG_IGN)
+    startup(settings, logs)
+    logger.info(f"shard {index}: watching {len(servers)} servers")
+    with ExitStack() as stack:
+        history = open_history()
+        if history is not None:
+            stack.enter_context(history)
+        dispatcher = ShardDispatcher(events, env.wait_time, index)
+        stack.callback(dispatcher.close)
+        asyncio.run(serve_shard(servers, control, dispatcher, history))
+
+
+def serve_sharded(dispatcher: Dispatcher):
+    from sharding import Coordinator
+
+    reload = threading.Event()
+    if hasattr(signal, "SIGHUP"):
+        signal.signal(signal.SIGHUP, lambda signum, frame: reload.set())
+    with Coordinator(shard_worker, env.shards, dispatcher, args=(env,)) as coordinator:
+        coordinator.start(env.server_settings())
+        while True:
+            if reload.wait(env.wait_time):
+                reload.clear()
+                from settings import Settings
+
+                try:
+                    servers = Settings().server_settings()
+                except ValueError as e:
+                    logger.error(f"reload failed, keeping current servers: {e}")
+                else:
+                    coordinator.rebalance(servers)
+            coordinator.ensure_running()
+
+
+def serve():
+    PROFILER.directory = Path(env.profile_dir)
+    install_signal_handlers(
+        PROFILER,
+        [
+            CHECK_SECONDS,
+            RCON_SECONDS,
+            PARSE_SECONDS,
+            DIFF_SECONDS,
+            RENDER_SECONDS,
+            WEBHOOK_SECONDS,
+        ],
+    )
+    if env.metrics_port is not None:
+        start_http_server(env.metrics_port, env.metrics_addr)
+        logger.info(f"metrics on http://{env.metrics_addr}:{env.metrics_port}/metrics")
+    with ExitStack() as stack:
+        outbox = open_outbox()
+        if outbox is not None:
+            stack.enter_context(outbox)
+        dispatcher = stack.enter_context(create_dispatcher(outbox))
+        history = open_history()
+        if history is not None:
+            stack.enter_context(history)
+        if env.shards:
+            serve_sharded(dispatcher)
+        elif env.engine == "asyncio":
+            asyncio.run(serve_async(dispatcher, history))
+        else:
+            serve_sync(dispatcher, history)
+
 
 if __name__ == "__main__":
+    startup()
     logger.info("start")
     try:
-        client = PalworldNotify()
-        while True:
-            client.check()
-            time.sleep(env.wait_time)
+        serve()
     except Exception as e:
         if __debug__:
             raise e
@@ -0,0 +1,416 @@
+import abc
+import threading
+import time
+from contextlib import contextmanager
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+if TYPE_CHECKING:
+    from http.server import ThreadingHTTPServer
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+DEFAULT_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+LabelValues = Tuple[str, ...]
+Report = List[Tuple[str, LabelValues, Any]]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values))
+    return "{" + pairs + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Metric(abc.ABC):
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._children: Dict[LabelValues, object] = {}
+
+    def labels(self, *values: str, **kwargs: str):
+        if kwargs:
+            values = tuple(kwargs[name] for name in self.labelnames)
+        if len(values) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}")
+        key = tuple(str(value) for value in values)
+        with self._lock:
+            child = self._children.get(key)
+            if child is None:
+                child = self._children[key] = self._new_child()
+            return child
+
+    @abc.abstractmethod
+    def _new_child(self) -> object:
+        pass
+
+    def _default(self):
+        return self.labels()
+
+    def drain(self) -> List[Tuple[LabelValues, Any]]:
+        with self._lock:
+            children = list(self._children.items())
+        return [(values, child.drain()) for values, child in children]  # type: ignore
+
+    def merge(self, values: LabelValues, state: Any):
+        self.labels(*values).merge(state)
+
+    def remove(self, *values: str):
+        with self._lock:
+            self._children.pop(tuple(str(value) for value in values), None)
+
+    def collect(self) -> List[str]:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type}",
+        ]
+        with self._lock:
+            children = list(self._children.items())
+        for values, child in children:
+            lines.extend(self._samples(values, child))
+        return lines
+
+    def _samples(self, values: LabelValues, child) -> List[str]:
+        labels = _format_labels(self.labelnames, values)
+        return [f"{self.name}{labels} {_format_value(child.get())}"]
+
+
+class _Value:
+    def __init__(self):
+        self._value = 0.0
+        self._lock = threading.Lock()
+        self._function: Optional[Callable[[], float]] = None
+
+    def inc(self, amount: float = 1):
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount: float = 1):
+        self.inc(-amount)
+
+    def set(self, value: float):
+        with self._lock:
+            self._value = value
+
+    def set_function(self, function: Callable[[], float]):
+        self._function = function
+
+    def get(self) -> float:
+        if self._function is not None:
+            return self._function()
+        with self._lock:
+            return self._value
+
+    def drain(self) -> float:
+        with self._lock:
+            value, self._value = self._value, 0.0
+        return value
+
+    def merge(self, value: float):
+        self.inc(value)
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount: float = 1):
+        self._default().inc(amount)
+
+    def _samples(self, values: LabelValues, child) -> List[str]:
+        labels = _format_labels(self.labelnames, values)
+        return [f"{self.name}_total{labels} {_format_value(child.get())}"]
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def _new_child(self):
+        return _Value()
+
+    def set(self, value: float):
+        self._default().set(value)
+
+    def set_function(self, function: Callable[[], float]):
+        self._default().set_function(function)
+
+    def snapshot(self) -> List[Tuple[LabelValues, float]]:
+        with self._lock:
+            children = list(self._children.items())
+        return [
+            (values, child.get())
+            for values, child in children
+            if child._function is None
+        ]
+
+
+class _Histogram:
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = tuple(buckets) + (float("inf"),)
+        self.counts = [0] * len(self.buckets)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        with self._lock:
+            self.sum += value
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    self.counts[i] += 1
+                    break
+
+    @contextmanager
+    def time(self) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    def drain(self) -> Tuple[List[int], float]:
+        with self._lock:
+            counts, total = self.counts, self.sum
+            self.counts = [0] * len(self.buckets)
+            self.sum = 0.0
+        return counts, total
+
+    def merge(self, state: Tuple[List[int], float]):
+        counts, total = state
+        with self._lock:
+            self.sum += total
+            for i, count in enumerate(counts):
+                self.counts[i] += count
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = buckets
+
+    def _new_child(self):
+        return _Histogram(self.buckets)
+
+    def observe(self, value: float):
+        self._default().observe(value)
+
+    def time(self):
+        return self._default().time()
+
+    def summary(self) -> List[Tuple[LabelValues, int, float]]:
+        with self._lock:
+            children = list(self._children.items())
+        result = []
+        for values, child in children:
+            with child._lock:
+                result.append((values, sum(child.counts), child.sum))
+        return result
+
+    def _samples(self, values: LabelValues, child) -> List[str]:
+        with child._lock:
+            counts = list(child.counts)
+            total = child.sum
+        names = self.labelnames + ("le",)
+        lines = []
+        cumulative = 0
+        for bound, count in zip(child.buckets, counts):
+            cumulative += count
+            labels = _format_labels(names, values + (_format_value(bound),))
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = _format_labels(self.labelnames, values)
+        lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+        lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: Metric) -> Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Duplicate metric: {metric.name}")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def drain(self) -> Report:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        report: Report = []
+        for metric in metrics:
+            if isinstance(metric, (Counter, Histogram)):
+                report.extend(
+                    (metric.name, values, state) for values, state in metric.drain()
+                )
+        return report
+
+    def merge(self, report: Report):
+        with self._lock:
+            metrics = dict(self._metrics)
+        for name, values, state in report:
+            metric = metrics.get(name)
+            if metric is not None:
+                metric.merge(values, state)
+
+    def snapshot(self) -> Report:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        report: Report = []
+        for metric in metrics:
+            if isinstance(metric, Gauge):
+                report.extend(
+                    (metric.name, values, value) for values, value in metric.snapshot()
+                )
+        return report
+
+    def replace_gauges(self, report: Report):
+        with self._lock:
+            metrics = dict(self._metrics)
+        current: Dict[str, Dict[LabelValues, float]] = {}
+        for name, values, value in report:
+            current.setdefault(name, {})[values] = value
+        for name, metric in metrics.items():
+            if not isinstance(metric, Gauge):
+                continue
+            values = current.get(name, {})
+            for labels, _ in metric.snapshot():
+                if labels not in values:
+                    metric.remove(*labels)
+            for labels, value in values.items():
+                metric.labels(*labels).set(value)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.collect())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def counter(name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+    return REGISTRY.register(Counter(name, documentation, labelnames))  # type: ignore
+
+
+def gauge(name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+    return REGISTRY.register(Gauge(name, documentation, labelnames))  # type: ignore
+
+
+def histogram(
+    name: str, documentation: str, labelnames: Sequence[str] = ()
+) -> Histogram:
+    return REGISTRY.register(Histogram(name, documentation, labelnames))  # type: ignore
+
+
+RCON_SECONDS = histogram(
+    "palworld_notify_rcon_seconds",
+    "RCON command round-trip time.",
+    ["server", "command"],
+)
+CHECK_SECONDS = histogram(
+    "palworld_notify_check_seconds", "Duration of one check() poll.", ["server"]
+)
+PARSE_SECONDS = histogram(
+    "palworld_notify_parse_seconds", "Time spent parsing ShowPlayers.", ["server"]
+)
+DIFF_SECONDS = histogram(
+    "palworld_notify_diff_seconds", "Time spent diffing the roster.", ["server"]
+)
+RENDER_SECONDS = histogram(
+    "palworld_notify_render_seconds", "Time spent rendering messages.", ["server"]
+)
+WEBHOOK_SECONDS = histogram(
+    "palworld_notify_webhook_seconds", "Webhook request latency.", ["sink"]
+)
+JOINS = counter("palworld_notify_joins", "Players that joined.", ["server"])
+LEAVES = counter("palworld_notify_leaves", "Players that left.", ["server"])
+FAILURES = counter("palworld_notify_failures", "Failed operations.", ["component"])
+RETRIES = counter("palworld_notify_retries", "Webhook delivery retries.", ["sink"])
+UNCHANGED = counter(
+    "palworld_notify_unchanged_polls",
+    "Polls skipped because ShowPlayers was unchanged.",
+    ["server"],
+)
+PLAYERS = gauge("palworld_notify_players", "Players currently online.", ["server"])
+QUEUE_DEPTH = gauge(
+    "palworld_notify_dispatcher_queue_depth", "Notifications waiting for delivery."
+)
+
+
+def start_http_server(
+    port: int, addr: str = "127.0.0.1", registry: Registry = REGISTRY
+) -> "ThreadingHTTPServer":
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?", 1)[0] not in ("/", "/metrics"):
+                self.send_error(404)
+                return
+            body = registry.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((addr, port), MetricsHandler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, name="metrics", daemon=True)
+    thread.start()
+    return server
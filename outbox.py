@@ -0,0 +1,136 @@
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+Entry = Tuple[str, str]
+
+
+class Outbox:
+    def __init__(
+        self,
+        path: Path,
+        commit_interval: float = 0.05,
+        compact_threshold: int = 1000,
+    ):
+        self.path = path
+        self.commit_interval = commit_interval
+        self.compact_threshold = compact_threshold
+        self.pending: Dict[Entry, List[str]] = {}
+        self._buffer: List[str] = []
+        self._acked = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._load()
+        self._file = open(path, "a", encoding="utf-8")
+        self._thread = threading.Thread(
+            target=self._commit_loop, name="outbox", daemon=True
+        )
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def replay(self) -> List[Tuple[str, str, List[str]]]:
+        with self._cond:
+            return [
+                (key, sink, messages) for (key, sink), messages in self.pending.items()
+            ]
+
+    def add(self, sink: str, messages: List[str]) -> str:
+        key = uuid.uuid4().hex
+        record = {"op": "add", "key": key, "sink": sink, "messages": messages}
+        with self._cond:
+            self.pending[(key, sink)] = messages
+            self._append(record)
+        return key
+
+    def ack(self, key: str, sink: str):
+        with self._cond:
+            if self.pending.pop((key, sink), None) is None:
+                return
+            self._acked += 1
+            self._append({"op": "ack", "key": key, "sink": sink})
+
+    def close(self):
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify()
+        self._thread.join()
+        self._file.close()
+
+    def _append(self, record: dict):
+        self._buffer.append(json.dumps(record, ensure_ascii=False) + "\n")
+        self._cond.notify()
+
+    def _load(self):
+        if not self.path.exists():
+            return
+        with open(self.path, encoding="utf-8") as file:
+            for line in file:
+                try:
+                    record = json.loads(line)
+                    entry = (record["key"], record["sink"])
+                except (ValueError, KeyError, TypeError):
+                    logger.warning(f"Skipping corrupt outbox record: {line!r}")
+                    continue
+                if record.get("op") == "add":
+                    self.pending[entry] = record["messages"]
+                elif record.get("op") == "ack":
+                    self.pending.pop(entry, None)
+        if self.pending:
+            logger.info(f"outbox: {len(self.pending)} undelivered notifications")
+        self._compact()
+
+    def _commit_loop(self):
+        while True:
+            with self._cond:
+                while not self._buffer and not self._closed:
+                    self._cond.wait()
+                closed = self._closed
+            if not closed:
+                time.sleep(self.commit_interval)
+            with self._cond:
+                lines, self._buffer = self._buffer, []
+                compact = self._acked >= self.compact_threshold
+            if lines:
+                self._file.writelines(lines)
+                self._file.flush()
+                os.fsync(self._file.fileno())
+            if compact:
+                self._file.close()
+                self._compact()
+                self._file = open(self.path, "a", encoding="utf-8")
+            if closed:
+                return
+
+    def _compact(self):
+        with self._cond:
+            pending = list(self.pending.items())
+            self._acked = 0
+        tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as file:
+            for (key, sink), messages in pending:
+                record = {"op": "add", "key": key, "sink": sink, "messages": messages}
+                file.write(json.dumps(record, ensure_ascii=False) + "\n")
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp, self.path)
+        if hasattr(os, "O_DIRECTORY"):
+            fd = os.open(self.path.parent, os.O_RDONLY | os.O_DIRECTORY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
@@ -0,0 +1,110 @@
+import logging
+import signal
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable, List, Optional, Sequence, TypeVar
+
+from metrics import Histogram
+
+if TYPE_CHECKING:
+    import cProfile
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+PER_THREAD = sys.version_info < (3, 12)
+
+
+class Profiler:
+    def __init__(self, directory: Path):
+        self.directory = directory
+        self.active = False
+        self._main: Optional["cProfile.Profile"] = None
+        self._profiles: List["cProfile.Profile"] = []
+        self._lock = threading.Lock()
+
+    def toggle(self) -> Optional[Path]:
+        if self.active:
+            return self.stop()
+        self.start()
+        return None
+
+    def start(self):
+        import cProfile
+
+        with self._lock:
+            if self.active:
+                return
+            self._profiles = []
+            self._main = cProfile.Profile()
+            self._main.enable()
+            self.active = True
+        logger.info("profiling started")
+
+    def stop(self) -> Optional[Path]:
+        import pstats
+
+        with self._lock:
+            if not self.active or self._main is None:
+                return None
+            self.active = False
+            self._main.disable()
+            stats = pstats.Stats(self._main)
+            for profile in self._profiles:
+                if profile.getstats():
+                    stats.add(profile)
+            self._main = None
+            self._profiles = []
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.directory / time.strftime("profile-%Y%m%d-%H%M%S.prof")
+        stats.dump_stats(path)
+        logger.info(f"profiling stopped, wrote {path}")
+        return path
+
+    def call(self, func: Callable[..., T], *args) -> T:
+        if not PER_THREAD:
+            return func(*args)
+        import cProfile
+
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            return func(*args)
+        try:
+            return func(*args)
+        finally:
+            profile.disable()
+            with self._lock:
+                if self.active:
+                    self._profiles.append(profile)
+
+
+PROFILER = Profiler(Path("logs"))
+
+
+def phase_report(phases: Sequence[Histogram]) -> str:
+    lines = [f"{'phase':<40} {'count':>8} {'total s':>10} {'mean ms':>10}"]
+    for histogram in phases:
+        for labels, count, total in histogram.summary():
+            name = histogram.name.removeprefix("palworld_notify_")
+            if labels:
+                name += "{" + ",".join(labels) + "}"
+            mean = total / count * 1e3 if count else 0.0
+            lines.append(f"{name:<40} {count:>8} {total:>10.3f} {mean:>10.3f}")
+    return "\n".join(lines)
+
+
+def install_signal_handlers(profiler: Profiler, phases: Sequence[Histogram]):
+    if threading.current_thread() is not threading.main_thread():
+        return
+    if hasattr(signal, "SIGUSR1"):
+        signal.signal(signal.SIGUSR1, lambda signum, frame: profiler.toggle())
+    if hasattr(signal, "SIGUSR2"):
+        signal.signal(
+            signal.SIGUSR2,
+            lambda signum, frame: logger.info("\n" + phase_report(phases)),
+        )
@@ -0,0 +1,277 @@
+import asyncio
+import logging
+import socket
+import threading
+import time
+from typing import Any, Callable, List, Optional, Sequence, Tuple
+
+from rcon.exceptions import EmptyResponse, SessionTimeout, WrongPassword
+from rcon.source import Client
+from rcon.source.proto import Packet, Type
+
+logger = logging.getLogger(__name__)
+
+CONNECTION_ERRORS = (
+    OSError,
+    EmptyResponse,
+    SessionTimeout,
+    asyncio.IncompleteReadError,
+    asyncio.TimeoutError,
+)
+
+IDEMPOTENT_COMMANDS = frozenset({"ShowPlayers", "Info"})
+
+
+class RconSession:
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        passwd: Optional[str] = None,
+        timeout: Optional[float] = None,
+        health_check_interval: float = 60,
+    ):
+        self.host = host
+        self.port = port
+        self.passwd = passwd
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        self._client: Optional[Client] = None
+        self._last_used = 0.0
+        self._sent = False
+        self._lock = threading.RLock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    @property
+    def connected(self) -> bool:
+        return self._client is not None
+
+    def connect(self) -> Client:
+        with self._lock:
+            if self._client is None:
+                client = Client(
+                    self.host, self.port, timeout=self.timeout, passwd=self.passwd
+                )
+                try:
+                    client.connect(login=True)
+                except BaseException:
+                    client.close()
+                    raise
+                logger.debug(f"RCON connected to {self.host}:{self.port}")
+                self._client = client
+                self._last_used = time.monotonic()
+            return self._client
+
+    def close(self):
+        with self._lock:
+            if self._client is not None:
+                self._client.close()
+                self._client = None
+
+    def health_check(self) -> bool:
+        with self._lock:
+            try:
+                self._run(self.connect(), "Info")
+                return True
+            except CONNECTION_ERRORS as e:
+                logger.warning(f"RCON health check failed: {e.__class__.__name__}")
+                self.close()
+                return False
+
+    def run(self, *args: str) -> str:
+        return self._call(self._run, args, args[0] in IDEMPOTENT_COMMANDS)
+
+    def run_many(self, commands: Sequence[Sequence[str]]) -> List[str]:
+        return self._call(self._run_many, (commands,), False)
+
+    def _call(
+        self, method: Callable[..., Any], args: Sequence[Any], idempotent: bool
+    ) -> Any:
+        with self._lock:
+            idle = time.monotonic() - self._last_used
+            if self.connected and idle > self.health_check_interval:
+                self.health_check()
+            reused = self.connected
+            self._sent = False
+            try:
+                return method(self.connect(), *args)
+            except CONNECTION_ERRORS as e:
+                self.close()
+                if not reused or (self._sent and not idempotent):
+                    raise
+                logger.info(
+                    f"RCON connection lost ({e.__class__.__name__}), reconnecting"
+                )
+                return method(self.connect(), *args)
+
+    def _run(self, client: Client, *args: str) -> str:
+        client.send(Packet.make_command(*args))
+        self._sent = True
+        response = client.read()
+        self._last_used = time.monotonic()
+        return response.payload.decode()
+
+    def _run_many(self, client: Client, commands: Sequence[Sequence[str]]) -> List[str]:
+        packets = [Packet.make_command(*command) for command in commands]
+        sock = self._socket(client)
+        sock.sendall(b"".join(bytes(packet) for packet in packets))
+        self._sent = True
+        with sock.makefile("rb") as file:
+            responses = [Packet.read(file) for _ in packets]
+        self._last_used = time.monotonic()
+        return [response.payload.decode() for response in responses]
+
+    @staticmethod
+    def _socket(client: Client) -> socket.socket:
+        return client._socket
+
+
+class AsyncRconSession:
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        passwd: Optional[str] = None,
+        timeout: Optional[float] = None,
+        health_check_interval: float = 60,
+        encoding: str = "utf-8",
+    ):
+        self.host = host
+        self.port = port
+        self.passwd = passwd
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        self.encoding = encoding
+        self._stream: Optional[Tuple[asyncio.StreamReader, asyncio.StreamWriter]] = None
+        self._last_used = 0.0
+        self._sent = False
+        self._lock = asyncio.Lock()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    @property
+    def connected(self) -> bool:
+        return self._stream is not None
+
+    async def connect(self):
+        if self._stream is None:
+            stream = await asyncio.wait_for(
+                asyncio.open_connection(self.host, self.port), timeout=self.timeout
+            )
+            try:
+                if self.passwd is not None:
+                    await self._login(*stream)
+            except BaseException:
+                stream[1].close()
+                raise
+            logger.debug(f"RCON connected to {self.host}:{self.port}")
+            self._stream = stream
+            self._last_used = time.monotonic()
+        return self._stream
+
+    async def close(self):
+        if self._stream is not None:
+            _, writer = self._stream
+            self._stream = None
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except OSError:
+                pass
+
+    async def health_check(self) -> bool:
+        async with self._lock:
+            return await self._health_check()
+
+    async def run(self, *args: str) -> str:
+        return await self._call(self._run, args, args[0] in IDEMPOTENT_COMMANDS)
+
+    async def run_many(self, commands: Sequence[Sequence[str]]) -> List[str]:
+        return await self._call(self._run_many, (commands,), False)
+
+    async def _call(
+        self, method: Callable[..., Any], args: Sequence[Any], idempotent: bool
+    ) -> Any:
+        async with self._lock:
+            idle = time.monotonic() - self._last_used
+            if self.connected and idle > self.health_check_interval:
+                await self._health_check()
+            reused = self.connected
+            self._sent = False
+            try:
+                return await method(*args)
+            except CONNECTION_ERRORS as e:
+                await self.close()
+                if not reused or (self._sent and not idempotent):
+                    raise
+                logger.info(
+                    f"RCON connection lost ({e.__class__.__name__}), reconnecting"
+                )
+                return await method(*args)
+
+    async def _health_check(self) -> bool:
+        try:
+            await self._run("Info")
+            return True
+        except CONNECTION_ERRORS as e:
+            logger.warning(f"RCON health check failed: {e.__class__.__name__}")
+            await self.close()
+            return False
+
+    async def _run(self, *args: str) -> str:
+        return (await self._run_many([args]))[0]
+
+    async def _run_many(self, commands: Sequence[Sequence[str]]) -> List[str]:
+        reader, writer = await self.connect()
+        packets = [
+            Packet.make_command(*command, encoding=self.encoding)
+            for command in commands
+        ]
+        writer.write(b"".join(bytes(packet) for packet in packets))
+        await asyncio.wait_for(writer.drain(), timeout=self.timeout)
+        self._sent = True
+        responses = [
+            await asyncio.wait_for(self._read(reader), timeout=self.timeout)
+            for _ in packets
+        ]
+        self._last_used = time.monotonic()
+        return [response.payload.decode(self.encoding) for response in responses]
+
+    async def _login(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        assert self.passwd is not None
+        login = Packet.make_login(self.passwd, encoding=self.encoding)
+        response = await asyncio.wait_for(
+            self._communicate(reader, writer, login), timeout=self.timeout
+        )
+        while response.type != Type.SERVERDATA_AUTH_RESPONSE:
+            response = await asyncio.wait_for(self._read(reader), timeout=self.timeout)
+        if response.id == -1:
+            raise WrongPassword()
+
+    async def _communicate(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, packet: Packet
+    ) -> Packet:
+        writer.write(bytes(packet))
+        await writer.drain()
+        return await self._read(reader)
+
+    async def _read(self, reader: asyncio.StreamReader) -> Packet:
+        size = int.from_bytes(await reader.readexactly(4), "little", signed=True)
+        if not size:
+            raise EmptyResponse()
+        body = await reader.readexactly(size)
+        return Packet(
+            int.from_bytes(body[0:4], "little", signed=True),
+            Type(int.from_bytes(body[4:8], "little", signed=True)),
+            body[8:-2],
+            body[-2:],
+        )
@@ -0,0 +1,148 @@
+import json
+import logging
+import os
+import re
+import time
+from pathlib import Path
+from typing import Dict, FrozenSet, Iterable, Iterator, List, NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+HEADER = "name,playeruid,steamid"
+
+
+class Player(NamedTuple):
+    name: str
+    playeruid: str
+    steamid: str
+
+    @property
+    def loading(self) -> bool:
+        return not self.playeruid.strip("0")
+
+
+def iter_players(text: str) -> Iterator[Player]:
+    text = text.replace("\x00", "")
+    lines = text.splitlines()
+    if not lines or lines[0].strip() != HEADER:
+        raise ValueError(f"Unexpected ShowPlayers reply: {text[:80]!r}")
+    if len(lines) > 1 and not text.endswith("\n"):
+        logger.debug(f"Skipping truncated ShowPlayers line: {lines.pop()!r}")
+    for line in lines[1:]:
+        fields = line.rstrip("\r").rsplit(",", 2)
+        if len(fields) != 3 or not fields[1] or not fields[2]:
+            logger.debug(f"Skipping incomplete ShowPlayers line: {line!r}")
+            continue
+        yield Player(*fields)
+
+
+def parse_players(text: str) -> List[Player]:
+    return list(iter_players(text))
+
+
+class RosterChanges(NamedTuple):
+    joined: List[Player]
+    left: List[Player]
+    online: int
+    previous: int
+
+    def __bool__(self) -> bool:
+        return bool(self.joined or self.left)
+
+    @property
+    def emptied(self) -> bool:
+        return self.online == 0 and self.previous > 0
+
+
+class RosterDiff:
+    def __init__(self):
+        self.roster: Optional[Dict[str, Player]] = None
+        self.loading: List[Player] = []
+
+    def restore(self, players: Iterable[Player]):
+        self.roster = {
+            player.playeruid: player for player in players if not player.loading
+        }
+
+    def update(self, players: Iterable[Player]) -> RosterChanges:
+        next_roster: Dict[str, Player] = {}
+        loading: List[Player] = []
+        for player in players:
+            if player.loading:
+                loading.append(player)
+            else:
+                next_roster[player.playeruid] = player
+        prev_roster = next_roster if self.roster is None else self.roster
+        self.roster = next_roster
+        self.loading = loading
+
+        joined = []
+        for uid, player in next_roster.items():
+            prev = prev_roster.get(uid)
+            if prev is None or prev.name != player.name:
+                joined.append(player)
+        left = []
+        for uid, player in prev_roster.items():
+            current = next_roster.get(uid)
+            if current is None or current.name != player.name:
+                left.append(player)
+
+        joined.sort(key=_sort_key)
+        left.sort(key=_sort_key)
+        return RosterChanges(joined, left, len(next_roster), len(prev_roster))
+
+
+def _sort_key(player: Player):
+    return (player.name, player.playeruid)
+
+
+class RosterSnapshot:
+    def __init__(self, path: Path, max_age: float):
+        self.path = path
+        self.max_age = max_age
+        self._saved: Optional[FrozenSet[Player]] = None
+        self._saved_at = 0.0
+
+    @classmethod
+    def for_server(cls, directory: Path, label: str, max_age: float):
+        name = re.sub(r"[^\w.-]", "_", label)
+        return cls(directory / f"roster-{name}.json", max_age)
+
+    def load(self) -> Optional[List[Player]]:
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+            saved_at = float(data["saved_at"])
+            players = [Player(*row) for row in data["players"]]
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.warning(f"Ignoring unreadable roster snapshot {self.path}: {e}")
+            return None
+        age = time.time() - saved_at
+        if age > self.max_age:
+            logger.info(f"Ignoring roster snapshot {self.path}, {age:.0f}s old")
+            return None
+        self._saved = frozenset(players)
+        self._saved_at = saved_at
+        return players
+
+    @property
+    def stale(self) -> bool:
+        return time.time() - self._saved_at >= self.max_age / 2
+
+    def save(self, players: Iterable[Player]):
+        current = frozenset(players)
+        if current == self._saved and not self.stale:
+            return
+        now = time.time()
+        data = {"saved_at": now, "players": [list(player) for player in current]}
+        tmp = self.path.with_suffix(".tmp")
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+            os.replace(tmp, self.path)
+        except OSError:
+            self._saved_at = 0.0
+            raise
+        self._saved = current
+        self._saved_at = now
@@ -0,0 +1,84 @@
+import random
+import time
+from enum import Enum
+
+
+class AdaptiveInterval:
+    def __init__(self, minimum: float, maximum: float, backoff: float = 2):
+        if minimum <= 0 or maximum < minimum:
+            raise ValueError(f"Invalid poll interval bounds: {minimum}, {maximum}")
+        self.minimum = minimum
+        self.maximum = maximum
+        self.backoff = backoff
+        self.current = minimum
+
+    def reset(self) -> float:
+        self.current = self.minimum
+        return self.current
+
+    def update(self, active: bool) -> float:
+        if active:
+            return self.reset()
+        self.current = min(self.current * self.backoff, self.maximum)
+        return self.current
+
+
+class Backoff:
+    def __init__(
+        self,
+        base: float = 1,
+        maximum: float = 60,
+        factor: float = 2,
+        jitter: float = 0.2,
+    ):
+        self.base = base
+        self.maximum = maximum
+        self.factor = factor
+        self.jitter = jitter
+        self.attempts = 0
+
+    def reset(self):
+        self.attempts = 0
+
+    def next(self) -> float:
+        delay = min(self.base * self.factor**self.attempts, self.maximum)
+        self.attempts += 1
+        return delay * (1 + random.uniform(-self.jitter, self.jitter))
+
+
+class CircuitState(str, Enum):
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 60):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CircuitState.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+
+    def remaining(self) -> float:
+        if self.state != CircuitState.OPEN:
+            return 0.0
+        return max(self.opened_at + self.reset_timeout - time.monotonic(), 0.0)
+
+    def allow(self) -> bool:
+        if self.state == CircuitState.OPEN and self.remaining() <= 0:
+            self.state = CircuitState.HALF_OPEN
+        return self.state != CircuitState.OPEN
+
+    def record_success(self):
+        self.state = CircuitState.CLOSED
+        self.failures = 0
+
+    def record_failure(self):
+        self.failures += 1
+        if (
+            self.state == CircuitState.HALF_OPEN
+            or self.failures >= self.failure_threshold
+        ):
+            self.state = CircuitState.OPEN
+            self.opened_at = time.monotonic()
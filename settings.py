@@ -0,0 +1,196 @@
+from enum import Enum
+from typing import List, Optional
+
+from pydantic import BaseModel, Field, field_validator, model_validator
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+from dispatcher import OverflowPolicy
+from templates import Template
+
+
+class LogLevel(str, Enum):
+    CRITICAL = "CRITICAL"
+    FATAL = "FATAL"
+    ERROR = "ERROR"
+    WARNING = "WARNING"
+    WARN = "WARN"
+    INFO = "INFO"
+    DEBUG = "DEBUG"
+    NOTSET = "NOTSET"
+
+
+class LogFormat(str, Enum):
+    TEXT = "text"
+    JSON = "json"
+
+
+class Engine(str, Enum):
+    ASYNCIO = "asyncio"
+    SYNC = "sync"
+
+
+class SinkType(str, Enum):
+    LINE = "line"
+    DISCORD = "discord"
+    WEBHOOK = "webhook"
+    SLACK = "slack"
+    FILE = "file"
+
+
+class SinkSettings(BaseModel):
+    type: SinkType
+    name: Optional[str] = Field(default=None)
+    url: Optional[str] = Field(default=None)
+    token: Optional[str] = Field(default=None)
+    path: Optional[str] = Field(default=None)
+    concurrency: int = Field(default=1, ge=1)
+    connect_timeout: Optional[float] = Field(default=None)
+    read_timeout: Optional[float] = Field(default=None)
+    max_retries: Optional[int] = Field(default=None)
+    retry_backoff: Optional[float] = Field(default=None)
+
+    @property
+    def label(self) -> str:
+        return self.name or self.type.value
+
+    @model_validator(mode="after")
+    def check_required(self) -> "SinkSettings":
+        if self.type == SinkType.LINE and not self.token:
+            raise ValueError("line sinks need a token")
+        if self.type in (SinkType.DISCORD, SinkType.WEBHOOK, SinkType.SLACK):
+            if not self.url:
+                raise ValueError(f"{self.type.value} sinks need a url")
+        return self
+
+
+class ServerSettings(BaseModel):
+    name: Optional[str] = Field(default=None)
+    ip: str = Field(default="127.0.0.1")
+    port: int = Field(default=25575)
+    password: Optional[str] = Field(default=None)
+    restart_on_last_leave: bool = Field(default=False)
+
+    @property
+    def label(self) -> str:
+        return self.name or f"{self.ip}:{self.port}"
+
+
+class Settings(BaseSettings):
+    def __init__(self):
+        super().__init__()
+
+    model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf-8")
+    ip: str = Field(default="127.0.0.1")
+    port: int = Field(default=25575)
+    password: Optional[str] = Field(default=None)
+    rcon_timeout: float = Field(default=10)
+    rcon_health_check_interval: float = Field(default=60)
+
+    line_notify_api: str = Field(default="https://notify-api.line.me/api/notify")
+    line_notify_token: Optional[str] = Field(default=None)
+
+    discord_webhook_url: Optional[str] = Field(default=None)
+
+    sinks: List[SinkSettings] = Field(default_factory=list)
+
+    http_connect_timeout: float = Field(default=5)
+    http_read_timeout: float = Field(default=10)
+    http_pool_connections: int = Field(default=1)
+    http_pool_maxsize: int = Field(default=4)
+    http_max_retries: int = Field(default=3)
+    http_retry_backoff: float = Field(default=1)
+
+    join_message: str = Field(default="{name} ({steamid}) has joined the server.")
+    leave_message: str = Field(default="{name} ({steamid}) has left the server.")
+
+    join_broadcast_message: str = Field(
+        default="{name} ({steamid}) has joined the server."
+    )
+    leave_broadcast_message: str = Field(
+        default="{name} ({steamid}) has left the server."
+    )
+    broadcast_max_length: int = Field(default=200)
+    broadcast_separator: str = Field(default="_/_")
+    restart_on_last_leave: bool = Field(default=False)
+
+    dispatcher_queue_size: int = Field(default=256)
+    dispatcher_overflow: OverflowPolicy = Field(default=OverflowPolicy.DROP_OLDEST)
+    dispatcher_block_timeout: Optional[float] = Field(default=None)
+    dispatcher_flush_timeout: Optional[float] = Field(default=30)
+
+    outbox_path: Optional[str] = Field(default=None)
+    outbox_commit_interval: float = Field(default=0.05)
+    outbox_compact_threshold: int = Field(default=1000)
+
+    engine: Engine = Field(default=Engine.ASYNCIO)
+    servers: List[ServerSettings] = Field(default_factory=list)
+    shards: int = Field(default=0, ge=0)
+
+    wait_time: int = Field(default=5)
+    poll_min_interval: float = Field(default=1)
+    poll_max_interval: Optional[float] = Field(default=None)
+    poll_backoff: float = Field(default=2)
+    retry_backoff_base: float = Field(default=1)
+    retry_backoff_max: float = Field(default=60)
+    retry_jitter: float = Field(default=0.2)
+    circuit_failure_threshold: int = Field(default=5)
+    circuit_reset_timeout: float = Field(default=60)
+
+    log_level: LogLevel = Field(default=LogLevel.INFO)
+    log_format: LogFormat = Field(default=LogFormat.TEXT)
+
+    metrics_port: Optional[int] = Field(default=None)
+    metrics_addr: str = Field(default="127.0.0.1")
+    profile_dir: str = Field(default="logs")
+    history_db: Optional[str] = Field(default=None)
+    snapshot_dir: Optional[str] = Field(default=None)
+    snapshot_max_age: float = Field(default=600)
+
+    @field_validator(
+        "join_message",
+        "leave_message",
+        "join_broadcast_message",
+        "leave_broadcast_message",
+    )
+    @classmethod
+    def validate_template(cls, value: str) -> str:
+        Template(value)
+        return value
+
+    @field_validator("sinks")
+    @classmethod
+    def validate_sink_names(cls, value: List[SinkSettings]) -> List[SinkSettings]:
+        labels = [sink.label for sink in value]
+        duplicates = sorted({label for label in labels if labels.count(label) > 1})
+        if duplicates:
+            raise ValueError(f"duplicate sink names: {', '.join(duplicates)}")
+        return value
+
+    def sink_settings(self) -> List[SinkSettings]:
+        sinks = list(self.sinks)
+        labels = {sink.label for sink in sinks}
+        if self.line_notify_token and "line" not in labels:
+            sinks.append(
+                SinkSettings(
+                    type=SinkType.LINE,
+                    url=self.line_notify_api,
+                    token=self.line_notify_token,
+                )
+            )
+        if self.discord_webhook_url and "discord" not in labels:
+            sinks.append(
+                SinkSettings(type=SinkType.DISCORD, url=self.discord_webhook_url)
+            )
+        return sinks
+
+    def server_settings(self) -> List[ServerSettings]:
+        if self.servers:
+            return self.servers
+        return [
+            ServerSettings(
+                ip=self.ip,
+                port=self.port,
+                password=self.password,
+                restart_on_last_leave=self.restart_on_last_leave,
+            )
+        ]
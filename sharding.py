@@ -0,0 +1,235 @@
+import bisect
+import hashlib
+import logging
+import multiprocessing
+import queue
+import threading
+from logging import handlers
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+from metrics import REGISTRY, Report
+
+if TYPE_CHECKING:
+    from dispatcher import Dispatcher
+    from settings import ServerSettings
+
+logger = logging.getLogger(__name__)
+
+_STOP = None
+MESSAGES = "messages"
+METRICS = "metrics"
+GAUGES = "gauges"
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    def __init__(self, nodes: Iterable[int], replicas: int = 64):
+        points = sorted(
+            (_hash(f"{node}:{replica}"), node)
+            for node in nodes
+            for replica in range(replicas)
+        )
+        self.hashes = [point for point, _ in points]
+        self.nodes = [node for _, node in points]
+
+    def owner(self, key: str) -> int:
+        index = bisect.bisect(self.hashes, _hash(key)) % len(self.hashes)
+        return self.nodes[index]
+
+
+def receive(control: "multiprocessing.Queue[Any]", interval: float = 1) -> Any:
+    parent = multiprocessing.parent_process()
+    while True:
+        try:
+            return control.get(timeout=interval)
+        except queue.Empty:
+            if parent is not None and not parent.is_alive():
+                return _STOP
+
+
+class ShardDispatcher:
+    def __init__(
+        self, events: "multiprocessing.Queue[Any]", report_interval: float, index: int
+    ):
+        self.events = events
+        self.index = index
+        self.report_interval = report_interval
+        self.stopped = threading.Event()
+        self.reporter = threading.Thread(
+            target=self._report_loop, name="shard-metrics", daemon=True
+        )
+        self.reporter.start()
+
+    def submit(self, messages: Sequence[str]):
+        if messages:
+            self.events.put((MESSAGES, list(messages)))
+
+    def report(self):
+        report = [item for item in REGISTRY.drain() if _nonzero(item[2])]
+        if report:
+            self.events.put((METRICS, report))
+        self.events.put((GAUGES, (self.index, REGISTRY.snapshot())))
+
+    def depth(self) -> int:
+        return 0
+
+    def close(self):
+        self.stopped.set()
+        self.reporter.join()
+        self.report()
+
+    def _report_loop(self):
+        while not self.stopped.wait(self.report_interval):
+            self.report()
+
+
+def _nonzero(state: Any) -> bool:
+    if isinstance(state, tuple):
+        return any(state[0])
+    return bool(state)
+
+
+class Coordinator:
+    def __init__(
+        self,
+        target: Callable[..., None],
+        shards: int,
+        dispatcher: "Dispatcher",
+        args: Sequence[Any] = (),
+    ):
+        self.target = target
+        self.shards = shards
+        self.dispatcher = dispatcher
+        self.args = tuple(args)
+        self.ring = HashRing(range(shards))
+        self.context = multiprocessing.get_context("spawn")
+        self.events: "multiprocessing.Queue[Any]" = self.context.Queue()
+        self.logs: "multiprocessing.Queue[Any]" = self.context.Queue()
+        self.controls: List["multiprocessing.Queue[Any]"] = []
+        self.processes: List[Optional[multiprocessing.process.BaseProcess]] = []
+        self.assigned: List[List["ServerSettings"]] = [[] for _ in range(shards)]
+        self.gauges: Dict[int, Report] = {}
+        root = logging.getLogger()
+        self.log_listener = handlers.QueueListener(self.logs, *root.handlers)
+        self.started = False
+        self.delivery = threading.Thread(
+            target=self._deliver, name="shard-delivery", daemon=True
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def assignment(
+        self, servers: Sequence["ServerSettings"]
+    ) -> List[List["ServerSettings"]]:
+        shards: List[List["ServerSettings"]] = [[] for _ in range(self.shards)]
+        for server in servers:
+            shards[self.ring.owner(server.label)].append(server)
+        return shards
+
+    def start(self, servers: Sequence["ServerSettings"]):
+        self.started = True
+        self.log_listener.start()
+        self.delivery.start()
+        self.assigned = self.assignment(servers)
+        self.controls = [self.context.Queue() for _ in range(self.shards)]
+        self.processes = [None] * self.shards
+        for index in range(self.shards):
+            self._spawn(index)
+
+    def rebalance(self, servers: Sequence["ServerSettings"]):
+        assigned = self.assignment(servers)
+        for index, (old, new) in enumerate(zip(self.assigned, assigned)):
+            if old != new:
+                logger.info(
+                    f"shard {index}: {len(old)} -> {len(new)} servers"
+                    f" ({', '.join(server.label for server in new) or 'idle'})"
+                )
+                self.controls[index].put(new)
+        self.assigned = assigned
+
+    def ensure_running(self):
+        for index, process in enumerate(self.processes):
+            if process is not None and not process.is_alive():
+                logger.error(
+                    f"shard {index}: worker exited with {process.exitcode}, restarting"
+                )
+                self._spawn(index)
+
+    def close(self, timeout: float = 10):
+        if not self.started:
+            return
+        self.started = False
+        for control in self.controls:
+            control.put(_STOP)
+        for process in self.processes:
+            if process is None:
+                continue
+            process.join(timeout)
+            if process.is_alive():
+                logger.warning(f"{process.name}: did not stop, terminating")
+                process.terminate()
+                process.join()
+        self.events.put(_STOP)
+        self.delivery.join()
+        self.log_listener.stop()
+
+    def _spawn(self, index: int):
+        self.controls[index] = self.context.Queue()
+        process = self.context.Process(
+            target=self.target,
+            args=(
+                *self.args,
+                index,
+                self.assigned[index],
+                self.controls[index],
+                self.events,
+                self.logs,
+            ),
+            name=f"shard-{index}",
+            daemon=True,
+        )
+        process.start()
+        self.processes[index] = process
+
+    def _deliver(self):
+        while True:
+            event = self.events.get()
+            if event is _STOP:
+                return
+            kind, payload = event
+            try:
+                if kind == METRICS:
+                    REGISTRY.merge(payload)
+                elif kind == GAUGES:
+                    self._merge_gauges(*payload)
+                else:
+                    self.dispatcher.submit(payload)
+            except Exception as e:
+                logger.error(f"shard delivery failed: {e.__class__.__name__}: {e}")
+
+    def _merge_gauges(self, index: int, report: Report):
+        self.gauges[index] = report
+        totals: Dict[Tuple[str, Tuple[str, ...]], float] = {}
+        for shard in self.gauges.values():
+            for name, values, value in shard:
+                totals[name, values] = totals.get((name, values), 0.0) + value
+        REGISTRY.replace_gauges(
+            [(name, values, value) for (name, values), value in totals.items()]
+        )
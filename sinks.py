@@ -0,0 +1,321 @@
+import abc
+import logging
+import sys
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, TextIO, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from dispatcher import chunk_messages
+from metrics import RETRIES, WEBHOOK_SECONDS
+
+if TYPE_CHECKING:
+    from settings import SinkSettings
+
+logger = logging.getLogger(__name__)
+
+SinkFactory = Callable[..., Any]
+SINKS: Dict[str, SinkFactory] = {}
+
+
+def register(kind: str) -> Callable[[SinkFactory], SinkFactory]:
+    def decorator(factory: SinkFactory) -> SinkFactory:
+        SINKS[kind] = factory
+        return factory
+
+    return decorator
+
+
+def create_sink(settings: "SinkSettings", **options):
+    for option in ("connect_timeout", "read_timeout", "max_retries", "retry_backoff"):
+        value = getattr(settings, option)
+        if value is not None:
+            options[option] = value
+    options["pool_maxsize"] = max(options.get("pool_maxsize", 1), settings.concurrency)
+    sink = SINKS[settings.type.value].configure(settings, **options)
+    sink.name = settings.label
+    sink.concurrency = settings.concurrency
+    return sink
+
+
+class DeliveryError(Exception):
+    pass
+
+
+class RateLimiter:
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.capacity = float(burst)
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self._refill(now)
+                wait = self.blocked_until - now
+                if wait <= 0 and self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                if wait <= 0:
+                    wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def block(self, seconds: float):
+        with self.lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+    def update(self, limit: Optional[int], remaining: int, reset_after: float):
+        with self.lock:
+            now = time.monotonic()
+            if limit:
+                self.capacity = float(limit)
+                if reset_after > 0:
+                    self.rate = limit / reset_after
+            self.tokens = min(float(remaining), self.capacity)
+            self.updated = now
+            if remaining <= 0:
+                self.blocked_until = max(self.blocked_until, now + reset_after)
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+
+class HttpSink(abc.ABC):
+    name = "http"
+    concurrency = 1
+    max_length = 2000
+    rate = 1.0
+    burst = 1
+
+    def __init__(
+        self,
+        connect_timeout: float = 5,
+        read_timeout: float = 10,
+        pool_connections: int = 1,
+        pool_maxsize: int = 4,
+        max_retries: int = 3,
+        retry_backoff: float = 1,
+    ):
+        self.timeout: Tuple[float, float] = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.limiter = RateLimiter(self.rate, self.burst)
+        self.retries = 0
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=pool_connections, pool_maxsize=pool_maxsize
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    @classmethod
+    def configure(cls, settings: "SinkSettings", **options):
+        return cls(settings.url, **options)
+
+    def __call__(self, messages: List[str]):
+        for text in chunk_messages(messages, self.max_length):
+            self.send(text)
+
+    @abc.abstractmethod
+    def send(self, text: str):
+        pass
+
+    def close(self):
+        self.session.close()
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                self.retries += 1
+                RETRIES.labels(self.name).inc()
+            self.limiter.acquire()
+            try:
+                with WEBHOOK_SECONDS.labels(self.name).time():
+                    response = self.session.post(url, timeout=self.timeout, **kwargs)
+            except requests.ReadTimeout as e:
+                raise DeliveryError(f"{self.name}: no response, not retrying") from e
+            except (requests.ConnectionError, requests.Timeout) as e:
+                logger.warning(f"{self.name}: {e.__class__.__name__}, retrying")
+                self.limiter.block(self.retry_backoff * 2**attempt)
+                continue
+            rate_limit = self.rate_limit(response)
+            if rate_limit is not None:
+                self.limiter.update(*rate_limit)
+            if response.status_code == 429 or response.status_code >= 500:
+                delay = self.retry_after(response)
+                if delay is None:
+                    delay = self.retry_backoff * 2**attempt
+                logger.warning(
+                    f"{self.name}: HTTP {response.status_code},"
+                    f" retrying in {delay:.1f}s"
+                )
+                self.limiter.block(delay)
+                continue
+            response.raise_for_status()
+            return response
+        raise DeliveryError(f"{self.name}: gave up after {self.max_retries} retries")
+
+    def rate_limit(
+        self, response: requests.Response
+    ) -> Optional[Tuple[Optional[int], int, float]]:
+        return None
+
+    def retry_after(self, response: requests.Response) -> Optional[float]:
+        value = response.headers.get("Retry-After")
+        if value is None:
+            return None
+        try:
+            return float(value)
+        except ValueError:
+            return None
+
+
+@register("line")
+class LineNotifySink(HttpSink):
+    name = "line"
+    max_length = 1000
+    rate = 1000 / 3600
+    burst = 10
+    api = "https://notify-api.line.me/api/notify"
+
+    def __init__(self, api: Optional[str], token: str, **kwargs):
+        super().__init__(**kwargs)
+        self.api = api or self.api
+        self.session.headers["Authorization"] = f"Bearer {token}"
+
+    @classmethod
+    def configure(cls, settings: "SinkSettings", **options):
+        return cls(settings.url, settings.token, **options)
+
+    def send(self, text: str):
+        self.post(self.api, data={"message": text})
+
+    def rate_limit(self, response: requests.Response):
+        headers = response.headers
+        if "X-RateLimit-Remaining" not in headers:
+            return None
+        limit = _int(headers.get("X-RateLimit-Limit"))
+        remaining = _int(headers.get("X-RateLimit-Remaining")) or 0
+        reset = _float(headers.get("X-RateLimit-Reset"))
+        reset_after = max(reset - time.time(), 0) if reset else 3600
+        return limit, remaining, reset_after
+
+
+@register("discord")
+class DiscordWebhookSink(HttpSink):
+    name = "discord"
+    max_length = 2000
+    rate = 5 / 2
+    burst = 5
+
+    def __init__(self, url: str, **kwargs):
+        super().__init__(**kwargs)
+        self.url = url
+
+    def send(self, text: str):
+        self.post(self.url, json={"content": text})
+
+    def rate_limit(self, response: requests.Response):
+        headers = response.headers
+        if "X-RateLimit-Remaining" not in headers:
+            return None
+        limit = _int(headers.get("X-RateLimit-Limit"))
+        remaining = _int(headers.get("X-RateLimit-Remaining")) or 0
+        reset_after = _float(headers.get("X-RateLimit-Reset-After")) or 0
+        return limit, remaining, reset_after
+
+    def retry_after(self, response: requests.Response) -> Optional[float]:
+        delay = super().retry_after(response)
+        if delay is None and response.status_code == 429:
+            try:
+                delay = float(response.json()["retry_after"])
+            except (ValueError, KeyError, TypeError):
+                return None
+        return delay
+
+
+@register("webhook")
+class JsonWebhookSink(HttpSink):
+    name = "webhook"
+    rate = 5.0
+    burst = 5
+
+    def __init__(self, url: str, token: Optional[str] = None, **kwargs):
+        super().__init__(**kwargs)
+        self.url = url
+        if token:
+            self.session.headers["Authorization"] = f"Bearer {token}"
+
+    @classmethod
+    def configure(cls, settings: "SinkSettings", **options):
+        return cls(settings.url, settings.token, **options)
+
+    def __call__(self, messages: List[str]):
+        self.post(self.url, json={"messages": messages})
+
+    def send(self, text: str):
+        self([text])
+
+
+@register("slack")
+class SlackWebhookSink(HttpSink):
+    name = "slack"
+    max_length = 4000
+    rate = 1.0
+    burst = 1
+
+    def __init__(self, url: str, **kwargs):
+        super().__init__(**kwargs)
+        self.url = url
+
+    def send(self, text: str):
+        self.post(self.url, json={"text": text})
+
+
+@register("file")
+class FileSink:
+    name = "file"
+    concurrency = 1
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self.lock = threading.Lock()
+        self.file: TextIO
+        if path is None or path == "-":
+            self.file = sys.stdout
+        else:
+            self.file = open(path, "a", encoding="utf-8")
+
+    @classmethod
+    def configure(cls, settings: "SinkSettings", **options):
+        return cls(settings.path)
+
+    def __call__(self, messages: List[str]):
+        with self.lock:
+            self.file.write("".join(f"{message}\n" for message in messages))
+            self.file.flush()
+
+    def close(self):
+        if self.file is not sys.stdout:
+            self.file.close()
+
+
+def _int(value: Optional[str]) -> Optional[int]:
+    try:
+        return int(float(value)) if value is not None else None
+    except ValueError:
+        return None
+
+
+def _float(value: Optional[str]) -> Optional[float]:
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
@@ -0,0 +1,83 @@
+import re
+import string
+from operator import itemgetter
+from typing import Any, Callable, Dict, Sequence, Tuple
+
+from roster import Player
+
+FIELDS = (*Player._fields, "server")
+SAMPLE = Player("Sample Player", "1234567890", "76561198000000000")
+
+_FIELD_NAME = re.compile(r"[.\[]")
+_NUMERIC_FIELDS = ("playeruid", "steamid")
+_NUMERIC_SPEC = re.compile(r"[bcdnoxX]$")
+
+
+class TemplateError(ValueError):
+    pass
+
+
+class Template:
+    def __init__(self, source: str, escape_spaces: bool = False):
+        self.source = source
+        self.escape_spaces = escape_spaces
+        fields = []
+        numeric = set()
+        formatted = False
+        try:
+            for _, field, spec, conversion in string.Formatter().parse(source):
+                if field is None:
+                    continue
+                name = _FIELD_NAME.split(field, 1)[0]
+                if name not in FIELDS:
+                    raise TemplateError(
+                        f"Unknown placeholder {{{field}}} in {source!r},"
+                        f" expected one of {', '.join(FIELDS)}"
+                    )
+                fields.append(name)
+                if name in _NUMERIC_FIELDS and _NUMERIC_SPEC.search(spec or ""):
+                    numeric.add(name)
+                formatted = formatted or bool(spec or conversion)
+        except ValueError as e:
+            if isinstance(e, TemplateError):
+                raise
+            raise TemplateError(f"Invalid template {source!r}: {e}") from e
+        self.fields: Tuple[str, ...] = tuple(dict.fromkeys(fields))
+        self._getters: Sequence[Tuple[str, Callable[[Player], str]]] = [
+            (name, itemgetter(Player._fields.index(name)))
+            for name in self.fields
+            if name != "server"
+        ]
+        self._numeric = tuple(numeric)
+        self._needs_server = "server" in self.fields
+        self._escape_values = escape_spaces and not formatted
+        self._escape_result = escape_spaces and formatted
+        if self._escape_values:
+            self._format = source.replace(" ", "_").format
+        else:
+            self._format = source.format
+        try:
+            self.render(SAMPLE, "server")
+        except Exception as e:
+            raise TemplateError(
+                f"Invalid template {source!r}: {e.__class__.__name__}: {e}"
+            ) from e
+
+    def __repr__(self):
+        return f"Template({self.source!r})"
+
+    def render(self, player: Player, server: str) -> str:
+        values: Dict[str, Any] = {
+            name: getter(player) for name, getter in self._getters
+        }
+        for name in self._numeric:
+            if values[name].isdigit():
+                values[name] = int(values[name])
+        if self._needs_server:
+            values["server"] = server
+        if self._escape_values:
+            values = {name: value.replace(" ", "_") for name, value in values.items()}
+        text = self._format(**values)
+        if self._escape_result:
+            text = text.replace(" ", "_")
+        return text
@@ -0,0 +1,52 @@
+import pytest
+
+from roster import Player, RosterDiff, parse_players
+
+
+def test_parse_players():
+    text = "name,playeruid,steamid\nAlice,111,76561190000000001\nBob,222,765\n"
+    assert parse_players(text) == [
+        Player("Alice", "111", "76561190000000001"),
+        Player("Bob", "222", "765"),
+    ]
+
+
+def test_parse_players_empty_server():
+    assert parse_players("name,playeruid,steamid\n") == []
+    assert parse_players("name,playeruid,steamid\n\x00\x00") == []
+
+
+def test_parse_players_drops_truncated_line():
+    text = "name,playeruid,steamid\nAlice,111,76561190000000001\nBob,222,7656119"
+    assert parse_players(text) == [Player("Alice", "111", "76561190000000001")]
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "",
+        "\x00\x00",
+        "Broadcasted: x\n",
+        "Alice,111,76561190000000001\n",
+        "Unknown command\n",
+    ],
+)
+def test_parse_players_rejects_unexpected_reply(text):
+    with pytest.raises(ValueError):
+        parse_players(text)
+
+
+@pytest.mark.parametrize("playeruid", ["0", "00000000"])
+def test_loading_player_is_not_announced(playeruid):
+    loading = Player("Bob", playeruid, "765")
+    alice = Player("Alice", "111", "76561190000000001")
+    assert loading.loading
+    assert not alice.loading
+    diff = RosterDiff()
+    diff.update([alice])
+    changes = diff.update([alice, loading])
+    assert not changes
+    assert diff.loading == [loading]
+    assert diff.update([alice, Player("Bob", "222", "765")]).joined == [
+        Player("Bob", "222", "765")
+    ]